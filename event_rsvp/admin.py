@@ -1,12 +1,31 @@
 """Django Admin-Settings for models of the ``event_rsvp`` application."""
 from django.contrib import admin
 
-from event_rsvp.models import Event, Guest
+from event_rsvp.models import (
+    ArchivedEvent,
+    ArchivedGuest,
+    Event,
+    Guest,
+    OutboxMessage,
+    RecurrenceRule,
+    WaitlistEntry,
+)
+
+
+class RecurrenceRuleInline(admin.StackedInline):
+    model = RecurrenceRule
+    extra = 0
 
 
 class EventAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("title",)}
+    inlines = [RecurrenceRuleInline]
 
 
+admin.site.register(ArchivedEvent)
+admin.site.register(ArchivedGuest)
 admin.site.register(Event, EventAdmin)
 admin.site.register(Guest)
+admin.site.register(OutboxMessage)
+admin.site.register(RecurrenceRule)
+admin.site.register(WaitlistEntry)
@@ -0,0 +1,147 @@
+"""
+Publishers for the server-sent events of the ``event_rsvp`` app.
+
+A broker fans a message out to all subscribers of a channel, so a change is
+read from the database once, no matter how many browsers are listening.
+The broker is configured with ``EVENT_RSVP_SSE_BROKER``.
+
+"""
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django_libs.loaders import load_member
+
+from . import settings
+
+
+class LocalBroker(object):
+    """
+    In-memory broker for the threads (or greenlets) of one process.
+
+    Only the latest message of a channel is kept. A subscriber, that misses
+    a message, gets the newest one instead, which is all a counter needs.
+
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.messages = {}
+        self.subscribers = defaultdict(int)
+
+    def get_version(self, channel):
+        return self.messages.get(channel, (0, None))[0]
+
+    def has_subscribers(self, channel):
+        return self.subscribers[channel] > 0
+
+    def publish(self, channel, data):
+        """Sends ``data`` to all subscribers of ``channel``."""
+        with self.condition:
+            self.messages[channel] = (self.get_version(channel) + 1, data)
+            self.condition.notify_all()
+
+    def listen(self, channel, timeout):
+        """
+        Yields the messages of ``channel`` as they are published.
+
+        ``None`` is yielded, if there was no message for ``timeout`` seconds.
+
+        """
+        with self.condition:
+            self.subscribers[channel] += 1
+            version = self.get_version(channel)
+        try:
+            while True:
+                with self.condition:
+                    if self.get_version(channel) == version:
+                        self.condition.wait(timeout)
+                    latest, data = self.messages.get(channel, (0, None))
+                if latest == version:
+                    yield None
+                else:
+                    version = latest
+                    yield data
+        finally:
+            with self.condition:
+                self.subscribers[channel] -= 1
+
+
+class CacheBroker(object):
+    """
+    Broker for several processes, that share the Django cache.
+
+    The subscribers poll the latest message of their channel from the cache,
+    which doesn't touch the database. While they listen, they keep a
+    subscriber key of the channel alive, so nothing is published to channels
+    without subscribers.
+
+    """
+    #: Seconds between two cache reads of a subscriber.
+    poll_interval = 1
+    #: Seconds, a message is kept in the cache.
+    message_timeout = 24 * 60 * 60
+    #: Seconds, a channel keeps its subscriber key after the last renewal.
+    subscriber_timeout = 30
+
+    def get_cache_key(self, channel):
+        return 'event_rsvp_broker_{0}'.format(channel)
+
+    def get_subscriber_key(self, channel):
+        return 'event_rsvp_broker_{0}_subscribers'.format(channel)
+
+    def has_subscribers(self, channel):
+        return cache.get(self.get_subscriber_key(channel)) is not None
+
+    def subscribe(self, channel):
+        """Renews the subscriber key of ``channel``."""
+        cache.set(self.get_subscriber_key(channel), True,
+                  self.subscriber_timeout)
+
+    def publish(self, channel, data):
+        """Sends ``data`` to all subscribers of ``channel``."""
+        cache.set(self.get_cache_key(channel), (uuid.uuid4().hex, data),
+                  self.message_timeout)
+
+    def get_version(self, channel):
+        message = cache.get(self.get_cache_key(channel))
+        return message and message[0]
+
+    def listen(self, channel, timeout):
+        """
+        Yields the messages of ``channel`` as they are published.
+
+        ``None`` is yielded, if there was no message for ``timeout`` seconds.
+
+        """
+        self.subscribe(channel)
+        version = self.get_version(channel)
+        waited = 0
+        subscribed = 0
+        while True:
+            time.sleep(self.poll_interval)
+            waited += self.poll_interval
+            subscribed += self.poll_interval
+            if subscribed * 2 >= self.subscriber_timeout:
+                self.subscribe(channel)
+                subscribed = 0
+            message = cache.get(self.get_cache_key(channel))
+            if message and message[0] != version:
+                version, data = message
+                waited = 0
+                yield data
+            elif waited >= timeout:
+                waited = 0
+                yield None
+
+
+_broker = None
+
+
+def get_broker():
+    """Returns the broker of this process or ``None``, if SSE are disabled."""
+    global _broker
+    if _broker is None and settings.SSE_BROKER:
+        _broker = load_member(settings.SSE_BROKER)()
+    return _broker
@@ -1,21 +1,43 @@
 """CMS Plugins for the ``event_rsvp`` app."""
+from django.core.cache import cache
 from django.utils.timezone import now
 from django.utils.translation import ugettext as _
 
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 
-from .models import Event
+from . import settings
+from .models import Event, UPCOMING_EVENTS_CACHE_KEY
 
 
 class CMSEventPlugin(CMSPluginBase):
     name = _('Upcoming Events')
     render_template = 'event_rsvp/upcoming_events.html'
 
+    def get_events(self):
+        """
+        Returns the upcoming events and caches them.
+
+        The cache is invalidated, if an event or a guest is saved or deleted
+        and as soon as the first cached event starts.
+
+        """
+        events = cache.get(UPCOMING_EVENTS_CACHE_KEY)
+        if events is None:
+            events = list(Event.objects.filter(
+                start__gt=now(), is_published=True).order_by(
+                    'start')[:settings.PLUGIN_EVENT_COUNT])
+            timeout = settings.PLUGIN_CACHE_TIMEOUT
+            if events:
+                delta = events[0].start - now()
+                timeout = min(timeout, delta.days * 86400 + delta.seconds)
+            if timeout > 0:
+                cache.set(UPCOMING_EVENTS_CACHE_KEY, events, timeout)
+        return events
+
     def render(self, context, instance, placeholder):
         context.update({
-            'events': Event.objects.filter(start__gt=now(),
-                                           is_published=True)[:3],
+            'events': self.get_events(),
             'placeholder': placeholder,
         })
         return context
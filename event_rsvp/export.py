@@ -0,0 +1,78 @@
+"""Streaming CSV export of the guest lists of the ``event_rsvp`` app."""
+import csv
+
+from django.utils.encoding import force_unicode
+from django.utils.translation import ugettext_lazy as _
+
+
+#: Columns of the export as ``(header, lookup)`` tuples. The user columns are
+#: joined in the same query, so the export doesn't need a query per guest.
+GUEST_EXPORT_COLUMNS = (
+    (_('Event'), 'event__title'),
+    (_('Start'), 'event__start'),
+    (_('Name'), 'name'),
+    (_('Email'), 'email'),
+    (_('Phone'), 'phone'),
+    (_('Number of seats'), 'number_of_seats'),
+    (_('Attending'), 'is_attending'),
+    (_('Creation date'), 'creation_date'),
+    (_('Username'), 'user__username'),
+    (_('First name'), 'user__first_name'),
+    (_('Last name'), 'user__last_name'),
+    (_('User email'), 'user__email'),
+)
+
+#: Spreadsheet applications evaluate cells, that start with one of these
+#: characters, as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo(object):
+    """
+    File-like object, that returns the written line instead of storing it.
+
+    """
+    def write(self, value):
+        return value
+
+
+def escape_value(value):
+    """
+    Returns ``value`` as unicode string.
+
+    Text, that would be evaluated as a formula by a spreadsheet application,
+    is prefixed with a single quote.
+
+    """
+    if value is None:
+        return u''
+    if isinstance(value, basestring) and value.startswith(FORMULA_PREFIXES):
+        return u"'{0}".format(value)
+    return force_unicode(value)
+
+
+def encode_row(row):
+    """Returns the escaped values of ``row`` as UTF-8 encoded strings."""
+    return [escape_value(value).encode('utf-8') for value in row]
+
+
+def get_guest_rows(queryset):
+    """
+    Yields the header and one row per guest of ``queryset``.
+
+    The guests are fetched with ``values_list(...).iterator()``, so neither
+    model instances nor the whole result are held in memory.
+
+    """
+    yield [header for header, lookup in GUEST_EXPORT_COLUMNS]
+    rows = queryset.order_by('event__start', 'event', 'pk').values_list(
+        *[lookup for header, lookup in GUEST_EXPORT_COLUMNS])
+    for row in rows.iterator():
+        yield row
+
+
+def iter_guest_csv(queryset):
+    """Yields the guests of ``queryset`` line by line as CSV."""
+    writer = csv.writer(Echo())
+    for row in get_guest_rows(queryset):
+        yield writer.writerow(encode_row(row))
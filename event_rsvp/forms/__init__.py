@@ -2,7 +2,7 @@
 from django_libs.loaders import load_member_from_setting
 from event_rsvp import settings
 
-from .base import EventForm
+from .base import EventForm, WaitlistEntryForm
 
 # importing GuestForm from settings
 try:
@@ -2,7 +2,12 @@
 from django import forms
 from django.utils.translation import ugettext_lazy as _
 
-from event_rsvp.models import Event, Guest
+from event_rsvp.models import (
+    Event,
+    Guest,
+    WaitlistEntry,
+    commit_on_success_unless_managed,
+)
 
 
 class EventForm(forms.ModelForm):
@@ -14,54 +19,73 @@ class EventForm(forms.ModelForm):
         """
         :param created_by: Django-Auth User model, which is calling this view
         :param create_from_template: Boolean to know, if someone is using a
-                                     template as draft.
+                                     template as draft. The template is
+                                     given as ``instance`` and only provides
+                                     the initial data of a new event.
 
         """
-        self.instance = kwargs.get('instance')
         self.create_from_template = create_from_template
-        if hasattr(self.instance, 'id') and not self.create_from_template:
-            # Ignore the current user if it's the update view or if the
-            # instance is a template
-            self.created_by = self.instance.created_by
+        if self.create_from_template:
+            # Don't touch the template, the template_name is the only
+            # attribute, which should not be preset
+            template = kwargs.pop('instance')
+            initial = forms.models.model_to_dict(
+                template, exclude=self._meta.exclude + ('template_name', ))
+            initial.update(kwargs.get('initial') or {})
+            kwargs['initial'] = initial
+        instance = kwargs.get('instance')
+        if instance is not None and instance.pk:
+            # Ignore the current user if it's the update view
+            self.created_by = instance.created_by
         else:
             # Add the current user as owner
             self.created_by = created_by
-        if self.create_from_template:
-            # If we use a template, the template_name is the only attribute,
-            # which should not be preset
-            self.instance.template_name = ''
         super(EventForm, self).__init__(*args, **kwargs)
 
-        if self.instance.id and self.instance.template_name:
+        if self.instance.pk and self.instance.template_name:
             self.this_is_a_template = True
         else:
             self.this_is_a_template = False
 
     def save(self, commit=True):
-        """Saves twice if a template should be created."""
-        if self.create_from_template:
-            # Save a new event
-            return forms.models.save_instance(
-                self, Event(created_by=self.created_by), self._meta.fields,
-                'created', commit, False)
-        self.instance.created_by = self.created_by
-        self.instance = super(EventForm, self).save(commit=True)
-        if self.instance.template_name and not self.this_is_a_template:
-            """
-            If someone wants to save this instance as a template, create a
-            second event as the template and keep the current instance in a
-            'normal' condition. This is necessary, 'cause otherwise the
-            template would keep the 'good' slug like 'foo-bar', while the new
-            event got a slug like '_foo-bar'.
-
-            """
-            template = Event(template_name=self.instance.template_name,
-                             created_by=self.created_by)
-            self.instance.template_name = ''
-            self.instance.save()
-            forms.models.save_instance(
-                self, template, self._meta.fields, 'created', commit, False)
-        return self.instance
+        """
+        Saves the event and creates a template, if one should be created.
+
+        If someone wants to save a new event as a template, the event stays
+        a 'normal' event and a copy of it is saved as the template. The event
+        gets the 'good' slug like 'foo-bar', while the template gets the next
+        free one. Both are written in one transaction with one write each.
+
+        With ``commit=False`` the unsaved event is returned and the template
+        is saved by ``save_m2m``.
+
+        """
+        instance = super(EventForm, self).save(commit=False)
+        instance.created_by = self.created_by
+        template = None
+        if instance.template_name and not self.this_is_a_template:
+            template = forms.models.construct_instance(
+                self, Event(created_by=self.created_by),
+                self._meta.fields, self._meta.exclude)
+            instance.template_name = ''
+            if not instance.pk:
+                # Allocate the slugs of both with one query
+                instance.slug, template.slug = Event.allocate_slugs(
+                    instance.title, 2)
+        save_m2m = self.save_m2m
+
+        def save_m2m_and_template():
+            save_m2m()
+            if template is not None:
+                template.save()
+
+        if commit:
+            with commit_on_success_unless_managed():
+                instance.save()
+                save_m2m_and_template()
+        else:
+            self.save_m2m = save_m2m_and_template
+        return instance
 
     class Meta:
         model = Event
@@ -113,8 +137,60 @@ class GuestForm(forms.ModelForm):
     def save(self, *args, **kwargs):
         self.instance.user = self.user
         self.instance.event = self.event
-        super(GuestForm, self).save(*args, **kwargs)
+        return super(GuestForm, self).save(*args, **kwargs)
 
     class Meta:
         model = Guest
         fields = ('name', 'email', 'phone', 'number_of_seats', 'message')
+
+
+class WaitlistEntryForm(forms.ModelForm):
+    """Form to join the waitlist of a fully booked event."""
+    required_css_class = 'requiredField'
+
+    def __init__(self, event, user, *args, **kwargs):
+        """
+        :param event: Event to wait for.
+        :param user: Current user or anonymous.
+
+        """
+        self.event = event
+        if user and user.is_authenticated():
+            self.user = user
+        else:
+            self.user = None
+        super(WaitlistEntryForm, self).__init__(*args, **kwargs)
+        for field in self.event.required_fields:
+            if field:
+                self.fields[field].required = True
+
+    def clean_number_of_seats(self):
+        data = self.cleaned_data['number_of_seats'] or 1
+        # The waitlist is first come, first served, so an entry, that can
+        # never be promoted, would block everyone behind it
+        if self.event.available_seats and data > self.event.available_seats:
+            if self.event.available_seats == 1:
+                msg = _('Sorry. The event has only 1 seat.')
+            else:
+                msg = _('Sorry. The event has only %(amount)s seats.') % {
+                    'amount': self.event.available_seats}
+            raise forms.ValidationError(msg)
+        if (self.event.max_seats_per_guest > 0
+                and data > self.event.max_seats_per_guest):
+            if self.event.max_seats_per_guest == 1:
+                msg = _('Pardon. There is only 1 seat per person reservable.')
+            else:
+                msg = _('Pardon. There are only %(amount)s seats per person'
+                        ' reservable.') % {
+                            'amount': self.event.max_seats_per_guest}
+            raise forms.ValidationError(msg)
+        return data
+
+    def save(self, *args, **kwargs):
+        self.instance.user = self.user
+        self.instance.event = self.event
+        return super(WaitlistEntryForm, self).save(*args, **kwargs)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ('name', 'email', 'phone', 'number_of_seats', 'message')
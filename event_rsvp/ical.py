@@ -0,0 +1,162 @@
+"""Streaming iCalendar (RFC 5545) feeds of the ``event_rsvp`` app."""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_unicode
+
+
+#: Fields of the events, that are rendered into the feeds.
+ICAL_EVENT_FIELDS = ('id', 'slug', 'title', 'description', 'start', 'end',
+                     'venue', 'street', 'city', 'zip', 'country',
+                     'creation_date', 'last_modified')
+
+
+#: Salt of the tokens in the URLs of the personal feeds.
+ICAL_TOKEN_SALT = 'event_rsvp.ical'
+
+
+def get_token_hash(user):
+    """
+    Returns the signature part of the feed token of ``user``.
+
+    The password hash is part of the signed value, so changing the password
+    revokes all feed URLs of the user.
+
+    """
+    return salted_hmac(ICAL_TOKEN_SALT, u'{0}{1}'.format(
+        user.pk, user.password)).hexdigest()[::2]
+
+
+def get_user_token(user):
+    """
+    Returns the token of the personal feed of ``user``.
+
+    Calendar clients cannot log in, so the feed URL contains this signed
+    token instead.
+
+    """
+    return u'{0}-{1}'.format(user.pk, get_token_hash(user))
+
+
+def get_token_user(token):
+    """Returns the active user of a token or ``None``, if it is invalid."""
+    try:
+        pk, token_hash = token.split('-', 1)
+        user = User.objects.get(pk=int(pk), is_active=True)
+    except (AttributeError, ValueError, User.DoesNotExist):
+        return None
+    if not constant_time_compare(token_hash, get_token_hash(user)):
+        return None
+    return user
+
+
+def escape_text(value):
+    """Escapes ``value`` for a TEXT property."""
+    return force_unicode(value or '').replace('\\', '\\\\').replace(
+        ';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace(
+            '\n', '\\n')
+
+
+def fold_line(line):
+    """
+    Returns ``line`` as UTF-8 encoded content line.
+
+    Lines, that are longer than 75 octets, are folded without splitting a
+    multi-byte character.
+
+    """
+    encoded = []
+    length = 0
+    for char in line:
+        char = char.encode('utf-8')
+        if length + len(char) > 75:
+            encoded.append('\r\n ')
+            length = 1
+        encoded.append(char)
+        length += len(char)
+    encoded.append('\r\n')
+    return ''.join(encoded)
+
+
+def format_datetime(value):
+    """Returns ``value`` as UTC date-time or as floating time, if naive."""
+    if timezone.is_aware(value):
+        return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def get_feed_state(queryset, prefix=''):
+    """
+    Returns the amount and the latest modification date of the events.
+
+    The events are given by ``queryset``, ``prefix`` is the lookup path from
+    the queried model to the event, e.g. ``event__`` for guests.
+
+    """
+    state = queryset.order_by().aggregate(
+        count=Count('pk'),
+        last_modified=Max('{0}last_modified'.format(prefix)))
+    return state['count'], state['last_modified']
+
+
+def get_etag(state):
+    """Returns the ETag of the feed with the given state."""
+    count, last_modified = state
+    return hashlib.md5('{0}-{1}'.format(
+        count, last_modified.isoformat() if last_modified else '')
+    ).hexdigest()
+
+
+def iter_calendar(queryset, request, prefix=''):
+    """
+    Yields the lines of an iCalendar with the events of ``queryset``.
+
+    The events are read with ``values(...).iterator()``, so no model
+    instances are created.
+
+    :param queryset: Queryset of events or of a model, that is related to
+      events, e.g. guests.
+    :param request: The current request, which provides the host name for
+      the URLs and UIDs.
+    :param prefix: Lookup path from the queried model to the event.
+
+    """
+    host = request.get_host()
+    yield fold_line(u'BEGIN:VCALENDAR')
+    yield fold_line(u'VERSION:2.0')
+    yield fold_line(u'PRODID:-//event_rsvp//{0}//EN'.format(host))
+    yield fold_line(u'CALSCALE:GREGORIAN')
+    lookups = ['{0}{1}'.format(prefix, field) for field in ICAL_EVENT_FIELDS]
+    for values in queryset.order_by(
+            '{0}start'.format(prefix)).values(*lookups).iterator():
+        event = dict((field, values[lookup]) for field, lookup in zip(
+            ICAL_EVENT_FIELDS, lookups))
+        url = reverse('rsvp_event_detail', kwargs={
+            'slug': event['slug'],
+            'year': '{0:04d}'.format(event['start'].year),
+            'month': '{0:02d}'.format(event['start'].month),
+            'day': '{0:02d}'.format(event['start'].day),
+        })
+        location = u', '.join([event[field] for field in (
+            'venue', 'street', 'zip', 'city', 'country') if event[field]])
+        for line in (
+                u'BEGIN:VEVENT',
+                # The database may reuse the ids of archived events
+                u'UID:event-{0}-{1}@{2}'.format(
+                    event['id'], format_datetime(event['creation_date']),
+                    host),
+                u'DTSTAMP:{0}'.format(format_datetime(
+                    event['last_modified'] or timezone.now())),
+                u'DTSTART:{0}'.format(format_datetime(event['start'])),
+                u'DTEND:{0}'.format(format_datetime(event['end'])),
+                u'SUMMARY:{0}'.format(escape_text(event['title'])),
+                u'DESCRIPTION:{0}'.format(escape_text(event['description'])),
+                u'LOCATION:{0}'.format(escape_text(location)),
+                u'URL:{0}'.format(request.build_absolute_uri(url)),
+                u'END:VEVENT'):
+            yield fold_line(line)
+    yield fold_line(u'END:VCALENDAR')
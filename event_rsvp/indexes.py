@@ -0,0 +1,79 @@
+"""
+Composite and partial database indexes for the ``event_rsvp`` app.
+
+Django 1.4 can only create single column indexes, so these are created by
+the South migrations. The migrations hold frozen copies of the definitions,
+so a change here needs a new migration.
+
+"""
+#: Tuples of ``(name, table, columns, condition)``. The condition turns the
+#: index into a partial index on backends, that support it.
+INDEXES = (
+    ('event_rsvp_event_is_published_start', 'event_rsvp_event',
+     ('is_published', 'start'), None),
+    ('event_rsvp_event_start_end', 'event_rsvp_event', ('start', 'end'), None),
+    ('event_rsvp_event_template_name', 'event_rsvp_event',
+     ('template_name', ), "template_name > ''"),
+    ('event_rsvp_guest_event_id_is_attending', 'event_rsvp_guest',
+     ('event_id', 'is_attending'), None),
+    ('event_rsvp_waitlistentry_event_id_creation_date',
+     'event_rsvp_waitlistentry', ('event_id', 'creation_date', 'id'), None),
+)
+
+#: psycopg2 interpolates the query parameters on the client side, so only
+#: PostgreSQL can match ``template_name > %s`` against the index condition.
+PARTIAL_INDEX_VENDORS = ('postgresql', )
+
+
+def get_indexes(connection, names=None):
+    """
+    Returns the entries of ``INDEXES`` with the given names or all.
+
+    Indexes of tables, that don't exist yet, are left out, so a migration
+    only touches the indexes of the tables, that have been created before.
+
+    """
+    tables = connection.introspection.table_names()
+    return [index for index in INDEXES if index[1] in tables
+            and (names is None or index[0] in names)]
+
+
+def get_create_index_sql(connection, names=None):
+    """Returns the ``CREATE INDEX`` statements for the given connection."""
+    qn = connection.ops.quote_name
+    statements = []
+    for name, table, columns, condition in get_indexes(connection, names):
+        sql = 'CREATE INDEX {0} ON {1} ({2})'.format(
+            qn(name), qn(table), ', '.join([qn(col) for col in columns]))
+        if condition and connection.vendor in PARTIAL_INDEX_VENDORS:
+            sql += ' WHERE {0}'.format(condition)
+        statements.append(sql)
+    return statements
+
+
+def get_drop_index_sql(connection, names=None):
+    """Returns the ``DROP INDEX`` statements for the given connection."""
+    qn = connection.ops.quote_name
+    statements = []
+    for name, table, columns, condition in get_indexes(connection, names):
+        if connection.vendor == 'mysql':
+            statements.append('DROP INDEX {0} ON {1}'.format(
+                qn(name), qn(table)))
+        else:
+            # SQLite silently drops the indexes of a table, that is rebuilt
+            statements.append('DROP INDEX IF EXISTS {0}'.format(qn(name)))
+    return statements
+
+
+def create_indexes(connection, names=None):
+    """Creates the indexes with the given names or all indexes of the app."""
+    cursor = connection.cursor()
+    for sql in get_create_index_sql(connection, names):
+        cursor.execute(sql)
+
+
+def drop_indexes(connection, names=None):
+    """Drops the indexes with the given names or all indexes of the app."""
+    cursor = connection.cursor()
+    for sql in get_drop_index_sql(connection, names):
+        cursor.execute(sql)
@@ -0,0 +1,41 @@
+"""Moves the past events and their guests to the archive tables."""
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils import timezone
+
+from event_rsvp import settings
+from event_rsvp.models import ArchivedEvent
+
+
+class Command(NoArgsCommand):
+    help = ('Moves the events, that ended before the given amount of days,'
+            ' and their guests to the archive. Archived events are still'
+            ' shown on their detail page.')
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--days', dest='days', type='int',
+            default=settings.ARCHIVE_AFTER,
+            help='Amount of days after their end, events are archived.'),
+        make_option(
+            '--batch-size', dest='batch_size', type='int',
+            default=settings.ARCHIVE_BATCH_SIZE,
+            help='Amount of events, that are moved per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        days = options.get('days')
+        if days is None:
+            days = settings.ARCHIVE_AFTER
+        batch_size = int(options.get('batch_size')
+                         or settings.ARCHIVE_BATCH_SIZE)
+        if int(days) < 0 or batch_size < 1:
+            raise CommandError('The amount of days must not be negative and'
+                               ' the batch size must be positive.')
+        events, guests = ArchivedEvent.objects.archive(
+            timezone.now() - timezone.timedelta(days=int(days)), batch_size,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS)
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write(
+                'Archived {0} event(s) with {1} guest(s).\n'.format(
+                    events, guests))
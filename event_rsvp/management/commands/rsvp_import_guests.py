@@ -0,0 +1,194 @@
+"""Imports guests from a CSV or JSON lines file."""
+import csv
+import json
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from event_rsvp.models import (
+    UPCOMING_EVENTS_CACHE_KEY, Event, Guest, get_bulk_batch_size)
+
+
+#: Columns, that are read from the file, besides ``event``.
+GUEST_IMPORT_FIELDS = ('name', 'email', 'phone', 'number_of_seats',
+                       'is_attending', 'message')
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    help = ('Imports guests from a CSV file with a header row or a JSON lines'
+            ' file. Known columns are "event" (the slug of the event) and'
+            ' {0}.'.format(', '.join(
+                ['"{0}"'.format(field) for field in GUEST_IMPORT_FIELDS])))
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--event', dest='event', default=None,
+            help='Slug of the event for rows without an "event" column.'),
+        make_option(
+            '--format', dest='format', default=None,
+            help='"csv" or "jsonl". Guessed from the file name by default.'),
+        make_option(
+            '--chunk-size', dest='chunk_size', type='int', default=1000,
+            help='Amount of guests, that are inserted with one query. It is'
+                 ' capped to the parameter limit of the database.'),
+    )
+
+    def handle(self, path=None, **options):
+        if not path:
+            raise CommandError('Please provide the file to import.')
+        file_format = options.get('format') or (
+            'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError('Unknown format "{0}".'.format(file_format))
+        chunk_size = int(options.get('chunk_size') or 1000)
+        if chunk_size < 1:
+            raise CommandError('The chunk size must be positive.')
+        chunk_size = get_bulk_batch_size(Guest, chunk_size)
+        self.default_event = options.get('event')
+        self.events = {}
+        self.free_seats = {}
+        self.reserved = defaultdict(int)
+
+        with open(path, 'rb') as import_file:
+            if file_format == 'csv':
+                rows = self.read_csv(import_file)
+            else:
+                rows = self.read_jsonl(import_file)
+            with transaction.commit_on_success():
+                imported, rejected = self.import_rows(rows, chunk_size)
+        # ``bulk_create`` and ``update`` don't send any signals
+        cache.delete(UPCOMING_EVENTS_CACHE_KEY)
+
+        if int(options.get('verbosity', 1)) > 0:
+            for line, error in rejected:
+                self.stdout.write(u'Rejected line {0}: {1}\n'.format(
+                    line, error).encode('utf-8'))
+            self.stdout.write(
+                'Imported {0} guest(s), rejected {1} row(s).\n'.format(
+                    imported, len(rejected)))
+
+    def read_csv(self, import_file):
+        """Yields ``(line, data)`` for every row of a CSV file."""
+        reader = csv.DictReader(import_file)
+        for row in reader:
+            yield reader.line_num, dict(
+                (key, value.decode('utf-8')) for key, value in row.items()
+                if key and value is not None)
+
+    def read_jsonl(self, import_file):
+        """
+        Yields ``(line, data)`` for every line of a JSON lines file.
+
+        ``data`` is ``None`` for lines, that are no JSON objects.
+
+        """
+        for line, content in enumerate(import_file, 1):
+            if not content.strip():
+                continue
+            try:
+                data = json.loads(content)
+            except ValueError:
+                data = None
+            yield line, data if isinstance(data, dict) else None
+
+    def import_rows(self, rows, chunk_size):
+        """
+        Validates and inserts the guests of ``rows``.
+
+        Returns the amount of imported guests and a list of ``(line, error)``
+        tuples of the rejected rows.
+
+        """
+        imported = 0
+        rejected = []
+        chunk = []
+        for line, data in rows:
+            if data is None:
+                rejected.append((line, 'Invalid JSON object.'))
+                continue
+            try:
+                guest = self.get_guest(data)
+            except ValidationError as ex:
+                rejected.append((line, ' '.join(ex.messages)))
+                continue
+            chunk.append(guest)
+            if len(chunk) >= chunk_size:
+                Guest.objects.bulk_create(chunk)
+                imported += len(chunk)
+                chunk = []
+        if chunk:
+            Guest.objects.bulk_create(chunk)
+            imported += len(chunk)
+        for pk, seats in self.reserved.items():
+            Event.objects.filter(pk=pk).update(
+                reserved_seats=models.F('reserved_seats') + seats)
+        return imported, rejected
+
+    def get_event(self, slug):
+        """
+        Returns the event with the given slug.
+
+        The events are locked until the import has been committed, so the
+        free seats cannot change in between.
+
+        """
+        if slug not in self.events:
+            try:
+                event = Event.objects.select_for_update().get(slug=slug)
+            except Event.DoesNotExist:
+                event = None
+            else:
+                self.free_seats[event.pk] = (
+                    event.available_seats - event.reserved_seats
+                    if event.available_seats else None)
+            self.events[slug] = event
+        if self.events[slug] is None:
+            raise ValidationError(
+                u'The event "{0}" does not exist.'.format(slug))
+        return self.events[slug]
+
+    def get_guest(self, data):
+        """Returns a validated, unsaved guest for the given row."""
+        slug = data.get('event') or self.default_event
+        if not slug:
+            raise ValidationError('No event given.')
+        event = self.get_event(slug)
+        for field in event.required_fields:
+            if not data.get(field):
+                raise ValidationError(
+                    u'The field "{0}" is required.'.format(field))
+
+        guest = Guest(event=event)
+        for field in GUEST_IMPORT_FIELDS:
+            value = data.get(field)
+            if value in (None, ''):
+                continue
+            if field == 'is_attending' and isinstance(value, basestring):
+                value = value.lower() not in ('0', 'false', 'no')
+            setattr(guest, field, value)
+        try:
+            guest.clean_fields(exclude=['event', 'user'])
+        except ValidationError as ex:
+            raise ValidationError([
+                u'{0}: {1}'.format(field, ' '.join(messages))
+                for field, messages in sorted(ex.message_dict.items())])
+        guest.number_of_seats = guest.number_of_seats or 1
+
+        if (event.max_seats_per_guest > 0
+                and guest.number_of_seats > event.max_seats_per_guest):
+            raise ValidationError(
+                'Only {0} seat(s) per guest can be reserved.'.format(
+                    event.max_seats_per_guest))
+        if guest.is_attending:
+            free_seats = self.free_seats[event.pk]
+            if free_seats is not None:
+                if guest.number_of_seats > free_seats:
+                    raise ValidationError(
+                        'Only {0} seat(s) left.'.format(free_seats))
+                self.free_seats[event.pk] -= guest.number_of_seats
+            self.reserved[event.pk] += guest.number_of_seats
+        return guest
@@ -0,0 +1,31 @@
+"""Creates the upcoming events of the recurrence rules."""
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils import timezone
+
+from event_rsvp import settings
+from event_rsvp.models import RecurrenceRule
+
+
+class Command(NoArgsCommand):
+    help = ('Creates the events of all active recurrence rules, that start'
+            ' within the horizon. Existing occurrences are not created'
+            ' again, so the command can run e.g. nightly.')
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--days', dest='days', type='int',
+            default=settings.RECURRENCE_HORIZON,
+            help='Amount of days ahead, up to which events are created.'),
+    )
+
+    def handle_noargs(self, **options):
+        days = options.get('days')
+        if days is None:
+            days = settings.RECURRENCE_HORIZON
+        if int(days) < 0:
+            raise CommandError('The amount of days must not be negative.')
+        created = RecurrenceRule.objects.materialize(
+            timezone.now() + timezone.timedelta(days=int(days)))
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Created {0} event(s).\n'.format(created))
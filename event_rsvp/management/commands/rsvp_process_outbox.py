@@ -0,0 +1,123 @@
+"""Sends the ``post_guest_create`` signals, that are waiting in the outbox."""
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+
+from django.core.mail import get_connection
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connection as db_connection
+from django.utils import timezone
+
+from event_rsvp import settings
+from event_rsvp.models import OutboxMessage
+from event_rsvp.signals import post_guest_create
+
+
+def deliver(messages):
+    """
+    Sends the signals of ``messages`` with one shared email connection.
+
+    Returns the list of ``(message, error)`` tuples, where ``error`` is
+    ``None`` if all receivers succeeded.
+
+    """
+    results = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as ex:
+        # Retry the whole batch later, if the mail server is unreachable
+        return [(message, unicode(ex)) for message in messages]
+    try:
+        for message in messages:
+            errors = [unicode(response) for receiver, response in (
+                post_guest_create.send_robust(
+                    sender=OutboxMessage, request=None, user=message.user,
+                    event=message.event, guest=message.guest,
+                    connection=connection))
+                if isinstance(response, Exception)]
+            results.append((message, '\n'.join(errors) or None))
+    finally:
+        connection.close()
+    return results
+
+
+def deliver_in_thread(messages):
+    """Calls ``deliver`` and closes the database connection of the thread."""
+    try:
+        return deliver(messages)
+    finally:
+        db_connection.close()
+
+
+class Command(NoArgsCommand):
+    help = ('Sends the post_guest_create signals of the outbox. Failed'
+            ' messages are retried with an exponential backoff.')
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--workers', dest='workers', type='int', default=4,
+            help='Amount of threads, that send the signals.'),
+        make_option(
+            '--batch-size', dest='batch_size', type='int',
+            default=settings.OUTBOX_BATCH_SIZE,
+            help='Amount of messages, that are fetched at once.'),
+    )
+
+    def handle_noargs(self, **options):
+        workers = int(options.get('workers') or 1)
+        batch_size = int(options.get('batch_size')
+                         or settings.OUTBOX_BATCH_SIZE)
+        if workers < 1 or batch_size < 1:
+            raise CommandError('Workers and batch size must be positive.')
+        pool = ThreadPool(workers) if workers > 1 else None
+        delivered = failed = 0
+        # Messages, that fail, are scheduled for later, so every message is
+        # attempted at most once per run
+        started = timezone.now()
+        try:
+            while True:
+                messages = list(OutboxMessage.objects.due(
+                    settings.OUTBOX_MAX_ATTEMPTS, now=started).select_related(
+                        'guest', 'event', 'user')[:batch_size])
+                if not messages:
+                    break
+                if pool is None:
+                    results = deliver(messages)
+                else:
+                    # Each thread reuses one email connection for its chunk
+                    chunks = [messages[i::workers] for i in range(workers)]
+                    results = [result for chunk_results in pool.map(
+                        deliver_in_thread, [c for c in chunks if c])
+                        for result in chunk_results]
+                count = self.save_results(results)
+                delivered += count
+                failed += len(results) - count
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Delivered {0} message(s), {1} failed.\n'.format(
+                delivered, failed))
+
+    def save_results(self, results):
+        """
+        Removes the delivered messages and reschedules the failed ones.
+
+        Returns the amount of delivered messages.
+
+        """
+        now = timezone.now()
+        delivered = []
+        for message, error in results:
+            if error is None:
+                delivered.append(message.pk)
+                continue
+            message.attempts += 1
+            message.last_error = error
+            message.next_attempt = now + timezone.timedelta(
+                minutes=2 ** message.attempts)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                attempts=message.attempts, last_error=message.last_error,
+                next_attempt=message.next_attempt)
+        OutboxMessage.objects.filter(pk__in=delivered).delete()
+        return len(delivered)
@@ -0,0 +1,24 @@
+"""Rebuilds the ``reserved_seats`` counters of all events."""
+from django.core.management.base import NoArgsCommand
+from django.db import models, transaction
+
+from event_rsvp.models import Event, Guest
+
+
+class Command(NoArgsCommand):
+    help = 'Recalculates the reserved seats of all events from their guests.'
+
+    def handle_noargs(self, **options):
+        with transaction.commit_on_success():
+            reserved = dict(
+                Guest.objects.filter(is_attending=True).values_list(
+                    'event').annotate(models.Sum('number_of_seats')))
+            updated = 0
+            for pk, reserved_seats in Event.objects.values_list(
+                    'pk', 'reserved_seats').iterator():
+                actual = int(reserved.get(pk) or 0)
+                if actual != reserved_seats:
+                    Event.objects.filter(pk=pk).update(reserved_seats=actual)
+                    updated += 1
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Updated {0} event(s).\n'.format(updated))
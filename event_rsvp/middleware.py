@@ -0,0 +1,138 @@
+"""Middlewares of the ``event_rsvp`` app."""
+import logging
+import random
+import re
+from collections import defaultdict
+
+from django.conf import settings as django_settings
+from django.db import connection
+
+from . import settings
+
+
+logger = logging.getLogger('event_rsvp.queries')
+
+#: Matches the quoted strings and numbers of an SQL statement.
+SQL_PARAMETER_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def get_query_stats(queries):
+    """
+    Returns the amount, the total time and the duplicates of ``queries``.
+
+    Duplicates are statements, that only differ in their parameters, like
+    the queries of an N+1 pattern. They are returned as list of
+    ``(count, statement)`` tuples, the most frequent first. Savepoints are
+    skipped, since only some backends use them.
+
+    :param queries: Queries as logged in ``connection.queries``.
+
+    """
+    queries = [query for query in queries
+               if not query['sql'].upper().startswith(
+                   ('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+    statements = defaultdict(int)
+    for query in queries:
+        statements[SQL_PARAMETER_RE.sub('?', query['sql'])] += 1
+    return {
+        'count': len(queries),
+        'time': sum(float(query['time']) for query in queries),
+        'duplicates': sorted([
+            (count, sql) for sql, count in statements.items() if count > 1],
+            reverse=True),
+    }
+
+
+class RecordedStream(object):
+    """
+    Wraps the content of a streamed response to record its queries.
+
+    ``callback`` is called once, when the content has been consumed or the
+    response is closed.
+
+    """
+    def __init__(self, content, callback):
+        self.content = content
+        self.iterator = iter(content)
+        self.callback = callback
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    __next__ = next
+
+    def close(self):
+        if hasattr(self.content, 'close'):
+            self.content.close()
+        if self.callback is not None:
+            callback, self.callback = self.callback, None
+            callback()
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Records the queries of the ``event_rsvp`` views.
+
+    In debug mode every request is recorded, otherwise only the share given
+    by ``EVENT_RSVP_QUERY_SAMPLE_RATE``. The stats are attached to the
+    response as ``query_stats``. Views, that exceed their ``query_budget``
+    or run duplicated queries, are logged as warning to
+    ``event_rsvp.queries``.
+
+    The queries of streamed responses run while the content is consumed, so
+    they are recorded and attached, once the stream is exhausted or closed.
+
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, '__module__', '').startswith('event_rsvp.'):
+            return None
+        if (not django_settings.DEBUG
+                and random.random() >= settings.QUERY_SAMPLE_RATE):
+            return None
+        request._event_rsvp_queries = (
+            view_func, len(connection.queries), connection.use_debug_cursor)
+        connection.use_debug_cursor = True
+        return None
+
+    def process_response(self, request, response):
+        recording = getattr(request, '_event_rsvp_queries', None)
+        if recording is None:
+            return response
+        del request._event_rsvp_queries
+
+        def record():
+            self.record(request, response, *recording)
+
+        if getattr(response, 'streaming', False):
+            response.streaming_content = RecordedStream(
+                response.streaming_content, record)
+        elif getattr(response, '_base_content_is_iter', False):
+            # Iterators are streamed by the ``HttpResponse`` of Django 1.4
+            response.content = RecordedStream(response._container, record)
+        else:
+            record()
+        return response
+
+    def record(self, request, response, view_func, start, use_debug_cursor):
+        """Attaches the stats to ``response`` and logs budget overruns."""
+        connection.use_debug_cursor = use_debug_cursor
+        stats = get_query_stats(connection.queries[start:])
+        stats.update({
+            'view': '{0}.{1}'.format(view_func.__module__, view_func.__name__),
+            'budget': getattr(view_func, 'query_budget', None),
+        })
+        response.query_stats = stats
+        if ((stats['budget'] is not None and stats['count'] > stats['budget'])
+                or stats['duplicates']):
+            logger.warning(
+                '%s %s ran %d queries (budget %s) in %.3fs, duplicates: %s',
+                request.method, request.path, stats['count'],
+                stats['budget'], stats['time'], stats['duplicates'],
+                extra={'request': request, 'query_stats': stats})
@@ -1,8 +1,19 @@
 """Models for the ``event_rsvp`` application."""
+import re
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from dateutil import parser, rrule
 from django import forms
+from django.conf import settings
 from django.core import exceptions
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import sql
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
 from django.template.defaultfilters import date, slugify
 from django.utils import timezone
 from django.utils.text import capfirst
@@ -11,7 +22,67 @@ from django.utils.translation import ugettext_lazy as _
 
 from filer.fields.image import FilerImageField
 
-from .settings import REQUIRED_FIELDS_CHOICES
+from .settings import OUTBOX_MAX_ATTEMPTS, REQUIRED_FIELDS_CHOICES
+from .signals import post_waitlist_promote
+
+try:
+    from pytz.exceptions import InvalidTimeError
+except ImportError:  # Without pytz ``make_aware`` accepts any local time
+    class InvalidTimeError(Exception):
+        pass
+
+
+#: Cache key of the upcoming events, that are shown by the ``CMSEventPlugin``
+UPCOMING_EVENTS_CACHE_KEY = 'event_rsvp_upcoming_events'
+
+#: Maximum amount of parameters of a query on SQLite
+SQLITE_MAX_VARIABLE_NUMBER = 999
+
+
+@contextmanager
+def commit_on_success_unless_managed():
+    """
+    Runs the block in a transaction, unless there is one already.
+
+    ``commit_on_success`` blocks don't nest, an inner block would commit or
+    roll back the transaction of the outer one and release its locks.
+
+    """
+    if transaction.is_managed():
+        yield
+    else:
+        with transaction.commit_on_success():
+            yield
+
+
+def get_bulk_batch_size(model, batch_size, using='default'):
+    """
+    Returns the amount of ``model`` instances, that ``bulk_create`` may insert
+    with one query.
+
+    Django 1.4 inserts all objects of ``bulk_create`` with one query, so the
+    batches must not exceed the parameter limit of SQLite.
+
+    """
+    if connections[using].vendor == 'sqlite':
+        batch_size = min(batch_size, SQLITE_MAX_VARIABLE_NUMBER // len(
+            model._meta.local_fields))
+    return max(batch_size, 1)
+
+
+def bulk_create_in_batches(model, objs, batch_size):
+    """
+    Inserts the ``model`` instances of the iterable ``objs`` with one query
+    per batch. The batches are capped with ``get_bulk_batch_size``.
+
+    """
+    batch_size = get_bulk_batch_size(model, batch_size, model.objects.db)
+    objs = iter(objs)
+    while True:
+        batch = list(islice(objs, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch)
 
 
 class MultiSelectFormField(forms.MultipleChoiceField):
@@ -85,8 +156,98 @@ class MultiSelectField(models.Field):
         return self.get_db_prep_value(value)
 
 
+class BitMaskMultiSelectField(MultiSelectField):
+    """
+    A ``MultiSelectField``, that stores the selected choices as a bit mask.
+
+    The n-th choice is stored in the n-th bit of an integer column, so new
+    choices must only ever be appended to the choices.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(BitMaskMultiSelectField, self).__init__(*args, **kwargs)
+        self.choice_bits = dict([
+            (value, 1 << index) for index, (value, label) in enumerate(
+                self.choices)])
+
+    def get_internal_type(self):
+        return "IntegerField"
+
+    def get_db_prep_value(self, value, connection=None, prepared=False):
+        if value is None:
+            return 0
+        if isinstance(value, (int, long)):
+            return value
+        return sum([self.choice_bits.get(choice, 0)
+                    for choice in set(self.to_python(value))])
+
+    def to_python(self, value):
+        if isinstance(value, list):
+            return value
+        if isinstance(value, basestring):
+            if not value.isdigit():
+                return [choice for choice in value.split(',') if choice]
+            value = int(value)
+        if not value:
+            return []
+        return [choice for choice, label in self.choices
+                if value & self.choice_bits[choice]]
+
+    def validate(self, value, model_instance):
+        if set(value) - set(self.choice_bits):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid_choice'] % value)
+
+    def get_bit(self, choice):
+        """Returns the bit, which represents ``choice`` in the bit mask."""
+        return self.choice_bits[choice]
+
+
 from south.modelsinspector import add_introspection_rules
-add_introspection_rules([], ["^event_rsvp\.models\.MultiSelectField"])
+add_introspection_rules([], [
+    "^event_rsvp\.models\.MultiSelectField",
+    "^event_rsvp\.models\.BitMaskMultiSelectField",
+])
+
+
+class SeatsUnavailable(Exception):
+    """Raised if a guest wants to reserve more seats than are left."""
+    pass
+
+
+class EventQuerySet(models.query.QuerySet):
+    """Custom queryset for the ``Event`` model."""
+    def requiring(self, field_name):
+        """Returns the events, that require the given guest field."""
+        qn = connections[self.db].ops.quote_name
+        field = self.model._meta.get_field('required_fields')
+        return self.extra(where=['({0}.{1} & %s) <> 0'.format(
+            qn(self.model._meta.db_table), qn(field.column))],
+            params=[field.get_bit(field_name)])
+
+    def with_attending_count(self):
+        """Annotates ``attending_count``, the amount of attending guests."""
+        qn = connections[self.db].ops.quote_name
+        opts = Guest._meta
+        return self.extra(select={'attending_count': (
+            'SELECT COUNT(*) FROM {0} WHERE {0}.{1} = {2}.{3} AND {0}.{4} = %s'
+        ).format(
+            qn(opts.db_table), qn(opts.get_field('event').column),
+            qn(self.model._meta.db_table), qn(self.model._meta.pk.column),
+            qn(opts.get_field('is_attending').column))},
+            select_params=[True])
+
+
+class EventManager(models.Manager):
+    """Custom manager for the ``Event`` model."""
+    def get_query_set(self):
+        return EventQuerySet(self.model, using=self._db)
+
+    def requiring(self, field_name):
+        return self.get_query_set().requiring(field_name)
+
+    def with_attending_count(self):
+        return self.get_query_set().with_attending_count()
 
 
 class Event(models.Model):
@@ -108,6 +269,8 @@ class Event(models.Model):
     :contact_email: Email of a person to contact.
     :contact_phone: Phone of a person to contact.
     :available_seats: Amount of seats available for this event.
+    :reserved_seats: Amount of seats reserved by attending guests. This is a
+      denormalized counter, which is maintained by the ``Guest`` model.
     :hide_available_seats: Checkfield to hide the information about available
       seats in the templates.
     :max_seats_per_guest: Maximum amount of seats per guest.
@@ -115,6 +278,8 @@ class Event(models.Model):
     :required_fields: Checkbox to select required guest fields.
     :template_name: Name can be set, if this event should be reusable.
     :is_published: Checkbox to publish/unpublish an event.
+    :last_modified: Date of the last change, used by the iCalendar feeds.
+    :recurrence_rule: The rule, which has created this event, if any.
 
     """
     created_by = models.ForeignKey(
@@ -136,6 +301,7 @@ class Event(models.Model):
     slug = models.SlugField(
         max_length=256,
         verbose_name=_('Slug'),
+        unique=True,
     )
 
     description = models.TextField(
@@ -211,6 +377,12 @@ class Event(models.Model):
         blank=True, null=True,
     )
 
+    reserved_seats = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Reserved seats'),
+        editable=False,
+    )
+
     hide_available_seats = models.BooleanField(
         default=False,
         verbose_name=_('Hide available seat information'),
@@ -225,9 +397,9 @@ class Event(models.Model):
         help_text=_('Even anonymous users can rsvp, without adding any info.'),
     )
 
-    required_fields = MultiSelectField(
+    required_fields = BitMaskMultiSelectField(
         verbose_name=_('Required fields'),
-        max_length=250, blank=True,
+        blank=True,
         choices=REQUIRED_FIELDS_CHOICES,
     )
 
@@ -253,29 +425,89 @@ class Event(models.Model):
         default=False,
     )
 
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Last modified'),
+    )
+
     image = FilerImageField(
         verbose_name=_('Image'),
         related_name='rsvp_event_images',
         null=True, blank=True,
     )
 
+    recurrence_rule = models.ForeignKey(
+        'event_rsvp.RecurrenceRule',
+        verbose_name=_('Recurrence rule'),
+        related_name='occurrences',
+        blank=True, null=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
+
+    objects = EventManager()
+
     def __unicode__(self):
         if self.template_name:
             return '{0} ({1})'.format(self.template_name, ugettext('Template'))
         return '{0} ({1})'.format(self.title, date(self.start))
 
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.title)
-        suspects = Event.objects.filter(slug=self.slug)
-        if suspects.count() > 0 and suspects[0] != self:
-            while Event.objects.filter(slug=self.slug).count() > 0:
-                try:
-                    number = int(self.slug[-1])
-                except ValueError:
-                    self.slug = self.slug + '0'
-                else:
-                    self.slug = self.slug[:-1] + str(number + 1)
-        super(Event, self).save(*args, **kwargs)
+        base = self.get_slug_base(self.title)
+        if not self.slug or not re.match(
+                r'^{0}(-?\d+)?$'.format(re.escape(base)), self.slug):
+            # The title has changed, so we need a new slug
+            self.slug = Event.allocate_slugs(self.title, exclude=self.pk)[0]
+        for attempt in range(3):
+            sid = transaction.savepoint()
+            try:
+                super(Event, self).save(*args, **kwargs)
+            except IntegrityError:
+                # The slug has been taken by a concurrent save
+                transaction.savepoint_rollback(sid)
+                if attempt == 2:
+                    raise
+                self.slug = Event.allocate_slugs(
+                    self.title, exclude=self.pk)[0]
+            else:
+                transaction.savepoint_commit(sid)
+                break
+
+    @staticmethod
+    def get_slug_base(title):
+        """Returns the slug for ``title`` without any numeric suffix."""
+        # Leave some space for the suffix
+        return slugify(title)[:240] or 'event'
+
+    @staticmethod
+    def allocate_slugs(title, amount=1, exclude=None):
+        """
+        Returns ``amount`` unused slugs for events with the given title.
+
+        All slugs starting with the slugified title are fetched with one
+        query. The first slug is the plain slugified title if it is still
+        free, the following slugs get the next free numeric suffixes.
+
+        :param title: Title of the event(s).
+        :param amount: Amount of slugs, that should be allocated.
+        :param exclude: Primary key of an event, that should be ignored.
+
+        """
+        base = Event.get_slug_base(title)
+        taken = Event.objects.filter(slug__startswith=base)
+        if exclude:
+            taken = taken.exclude(pk=exclude)
+        taken = set(taken.values_list('slug', flat=True))
+        slugs = []
+        if base not in taken:
+            slugs.append(base)
+        pattern = re.compile(r'^{0}-(\d+)$'.format(re.escape(base)))
+        suffix = max([int(match.group(1)) for match in map(
+            pattern.match, taken) if match] + [0])
+        while len(slugs) < amount:
+            suffix += 1
+            slugs.append('{0}-{1}'.format(base, suffix))
+        return slugs
 
     def get_absolute_url(self, url='rsvp_event_detail'):
         return reverse(url, kwargs={
@@ -291,22 +523,53 @@ class Event(models.Model):
     def get_delete_url(self):
         return self.get_absolute_url(url='rsvp_event_delete')
 
+    def get_ical_url(self):
+        return self.get_absolute_url(url='rsvp_event_detail_ical')
+
     def get_template_url(self):
         return reverse('rsvp_event_create_from_template', kwargs={
             'pk': self.pk})
 
     def get_free_seats(self):
-        reserved = self.guests.all().aggregate(models.Sum('number_of_seats'))
         if self.available_seats:
-            return self.available_seats - int(reserved.get(
-                'number_of_seats__sum') or 0)
+            return self.available_seats - self.reserved_seats
         return _('Unlimited seats available.')
 
+    def get_free_seats_count(self):
+        """Returns the amount of free seats or ``None``, if unlimited."""
+        if not self.available_seats:
+            return None
+        return self.available_seats - self.reserved_seats
+
     def is_bookable(self):
         if self.start < timezone.now():
             return False
         return True
 
+    def update_reserved_seats(self, amount):
+        """
+        Adds ``amount`` (which may be negative) to the ``reserved_seats``.
+
+        The database row is updated with a conditional ``F()`` expression, so
+        concurrent reservations can never exceed the ``available_seats``.
+        Returns ``False`` if there are not enough free seats left.
+
+        """
+        if not amount:
+            return True
+        events = Event.objects.filter(pk=self.pk)
+        if amount > 0:
+            events = events.filter(
+                models.Q(available_seats__isnull=True)
+                | models.Q(available_seats=0)
+                | models.Q(reserved_seats__lte=models.F('available_seats')
+                           - amount))
+        if not events.update(
+                reserved_seats=models.F('reserved_seats') + amount):
+            return False
+        self.reserved_seats += amount
+        return True
+
 
 class Guest(models.Model):
     """
@@ -374,9 +637,914 @@ class Guest(models.Model):
     )
 
     def __unicode__(self):
+        return '{0} - {1}'.format(self.get_name(), self.event)
+
+    def get_name(self):
+        """Returns the name of the guest without touching the event."""
+        if self.user:
+            return self.user.get_full_name() or self.user.email
+        return self.name or self.email or ugettext('anonymous')
+
+    def save(self, *args, **kwargs):
+        """
+        Keeps the ``reserved_seats`` counter of the event(s) up to date.
+
+        :raises SeatsUnavailable: If the event hasn't got enough free seats.
+
+        """
+        with commit_on_success_unless_managed():
+            old = None
+            if self.pk:
+                try:
+                    old = Guest.objects.only(
+                        'event', 'number_of_seats', 'is_attending').get(
+                            pk=self.pk)
+                except Guest.DoesNotExist:
+                    pass
+            amount = self.get_reserved_seats()
+            released_event_id = None
+            moved = old is not None and old.event_id != self.event_id
+            if old and not moved:
+                amount -= old.get_reserved_seats()
+            # Reserve the seats before anything is written, so the event row
+            # stays locked until the transaction is committed and nothing has
+            # to be undone, if the seats are unavailable
+            if amount > 0 and not self.event.update_reserved_seats(amount):
+                raise SeatsUnavailable
+            if moved and old.get_reserved_seats():
+                # The guest has been moved to another event
+                Event.objects.filter(pk=old.event_id).update(
+                    reserved_seats=models.F('reserved_seats')
+                    - old.get_reserved_seats())
+                released_event_id = old.event_id
+            super(Guest, self).save(*args, **kwargs)
+            if amount < 0:
+                self.event.update_reserved_seats(amount)
+                released_event_id = self.event_id
+            if released_event_id:
+                WaitlistEntry.objects.promote(released_event_id)
+        # Publish the new counters to the live seat streams. This happens
+        # after the commit, unless the caller manages the transaction
+        from .seats import publish_seat_stats
+        if amount:
+            publish_seat_stats(self.event_id)
+        if released_event_id and released_event_id != self.event_id:
+            publish_seat_stats(released_event_id)
+
+    def get_reserved_seats(self):
+        """Returns the amount of seats this guest occupies at the event."""
+        if not self.is_attending:
+            return 0
+        return self.number_of_seats or 0
+
+
+class WaitlistEntryManager(models.Manager):
+    """Custom manager for the ``WaitlistEntry`` model."""
+    def get_head(self, event_id):
+        """
+        Returns the oldest entry of the waitlist of an event or ``None``.
+
+        The entry is fetched together with its event through the
+        ``(event_id, creation_date, id)`` index, so the lookup doesn't depend
+        on the length of the waitlist. Both rows are locked until the end of
+        the current transaction.
+
+        """
+        entries = list(self.filter(event=event_id).select_related(
+            'event').select_for_update().order_by('creation_date', 'pk')[:1])
+        return entries[0] if entries else None
+
+    def promote(self, event_id):
+        """
+        Turns the head of the waitlist into a guest, while it fits.
+
+        The queue is strictly first come, first served: if the head needs
+        more seats than are free, nobody behind it is promoted. The entries
+        are promoted within the current transaction, so they stay locked
+        until it is committed. Returns the created guests.
+
+        """
+        guests = []
+        with commit_on_success_unless_managed():
+            while True:
+                entry = self.get_head(event_id)
+                if entry is None:
+                    break
+                free_seats = entry.event.get_free_seats_count()
+                if free_seats is not None and (
+                        entry.number_of_seats > free_seats):
+                    break
+                try:
+                    guests.append(entry.promote())
+                except SeatsUnavailable:
+                    # Nothing has been written, the seats are checked first
+                    break
+        return guests
+
+
+class WaitlistEntry(models.Model):
+    """
+    Model for people, who are waiting for seats of a fully booked event.
+
+    :event: Event to visit.
+    :user: User model of the waiting person.
+    :name: Name of the waiting person.
+    :email: Email of the waiting person.
+    :phone: Phone number of the waiting person.
+    :number_of_seats: Amount of seats to book.
+    :message: A response from a potential attendee.
+    :creation_date: Date of joining the waitlist, which defines the order.
+
+    """
+    event = models.ForeignKey(
+        'event_rsvp.Event',
+        verbose_name=_('Event'),
+        related_name='waitlist',
+    )
+
+    user = models.ForeignKey(
+        'auth.User',
+        verbose_name=_('User'),
+        blank=True, null=True,
+    )
+
+    name = models.CharField(
+        max_length=50,
+        verbose_name=_('Name'),
+        blank=True,
+    )
+
+    email = models.EmailField(
+        verbose_name=_('Email'),
+        blank=True,
+    )
+
+    phone = models.CharField(
+        max_length=50,
+        verbose_name=_('Phone'),
+        blank=True,
+    )
+
+    number_of_seats = models.PositiveIntegerField(
+        verbose_name=_('Number of seats'),
+        default=1,
+    )
+
+    message = models.TextField(
+        verbose_name=_('Message'),
+        max_length=4000,
+        blank=True,
+    )
+
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Creation date'),
+    )
+
+    objects = WaitlistEntryManager()
+
+    class Meta:
+        ordering = ('creation_date', 'pk')
+
+    def __unicode__(self):
+        return '{0} - {1}'.format(self.get_name(), self.event)
+
+    def get_name(self):
+        """Returns the name of the waiting person."""
         if self.user:
-            return '{0} - {1}'.format(
-                self.user.get_full_name() or self.user.email, self.event)
-        elif self.name or self.email:
-            return '{0} - {1}'.format(self.name or self.email, self.event)
-        return '{0} - {1}'.format(ugettext('anonymous'), self.event)
+            return self.user.get_full_name() or self.user.email
+        return self.name or self.email or ugettext('anonymous')
+
+    def promote(self):
+        """
+        Creates a guest for this entry and removes it from the waitlist.
+
+        :raises SeatsUnavailable: If the event hasn't got enough free seats.
+
+        """
+        with commit_on_success_unless_managed():
+            guest = Guest(
+                event=self.event, user_id=self.user_id, name=self.name,
+                email=self.email, phone=self.phone,
+                number_of_seats=self.number_of_seats, message=self.message)
+            guest.save()
+            self.delete()
+        post_waitlist_promote.send(
+            sender=WaitlistEntry, entry=self, guest=guest, user=guest.user,
+            event=guest.event)
+        return guest
+
+
+class OutboxMessageManager(models.Manager):
+    """Custom manager for the ``OutboxMessage`` model."""
+    def due(self, max_attempts, now=None):
+        """Returns the messages, that should be delivered now."""
+        return self.filter(
+            next_attempt__lte=now or timezone.now(),
+            attempts__lt=max_attempts).order_by('next_attempt', 'pk')
+
+
+class OutboxMessage(models.Model):
+    """
+    A ``post_guest_create`` signal, that still has to be sent.
+
+    If ``EVENT_RSVP_USE_OUTBOX`` is set, ``GuestCreateView`` writes these
+    messages in the transaction of the new guest and the
+    ``rsvp_process_outbox`` command sends the signals later on.
+
+    :guest: The new guest.
+    :event: Event of the guest.
+    :user: User, who created the guest, if any.
+    :creation_date: Date of the message creation.
+    :next_attempt: The message is not delivered before this date.
+    :attempts: Amount of failed deliveries.
+    :last_error: Error of the last failed delivery.
+
+    """
+    guest = models.ForeignKey(
+        'event_rsvp.Guest',
+        verbose_name=_('Guest'),
+    )
+
+    event = models.ForeignKey(
+        'event_rsvp.Event',
+        verbose_name=_('Event'),
+    )
+
+    user = models.ForeignKey(
+        'auth.User',
+        verbose_name=_('User'),
+        blank=True, null=True,
+    )
+
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Creation date'),
+    )
+
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Next attempt'),
+        db_index=True,
+    )
+
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Attempts'),
+    )
+
+    last_error = models.TextField(
+        verbose_name=_('Last error'),
+        blank=True,
+    )
+
+    objects = OutboxMessageManager()
+
+    def __unicode__(self):
+        return '{0} - {1}'.format(self.guest_id, self.event_id)
+
+
+def to_local(value):
+    """Returns ``value`` as naive date in the current time zone."""
+    if timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def from_local(value):
+    """
+    Returns the naive local date ``value`` as aware date, if needed.
+
+    Times in the gap of a DST change are shifted by the DST offset, ambiguous
+    ones are taken as standard time.
+
+    """
+    value = value.replace(tzinfo=None)
+    if settings.USE_TZ:
+        current_timezone = timezone.get_current_timezone()
+        try:
+            return timezone.make_aware(value, current_timezone)
+        except InvalidTimeError:
+            return current_timezone.normalize(
+                current_timezone.localize(value, is_dst=False))
+    return value
+
+
+def format_start(value):
+    """Returns the start ``value`` as ISO string in UTC, if it is aware."""
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+class RecurrenceRuleManager(models.Manager):
+    """Custom manager for the ``RecurrenceRule`` model."""
+    def materialize(self, until):
+        """
+        Creates the missing occurrences of all active rules up to ``until``.
+
+        Returns the amount of created events.
+
+        """
+        created = 0
+        for pk in self.filter(is_active=True).values_list('pk', flat=True):
+            with transaction.commit_on_success():
+                # Concurrent runs must not create the same occurrences
+                rule = self.select_for_update().select_related(
+                    'template').get(pk=pk)
+                created += len(rule.materialize(until))
+        if created:
+            # ``bulk_create`` doesn't send any signals
+            cache.delete(UPCOMING_EVENTS_CACHE_KEY)
+        return created
+
+
+class RecurrenceRule(models.Model):
+    """
+    Rule to create events from a template in regular intervals.
+
+    :template: The event template, the occurrences are copied from.
+    :frequency: ``weekly``, ``monthly`` or ``dates`` for custom dates.
+    :interval: Amount of weeks or months between two occurrences.
+    :first_start: Start of the first occurrence. Weekday and time of the
+      following ones are taken from it.
+    :until: No occurrence starts after this date, if set.
+    :dates: Start dates of the occurrences, one per line, if the frequency is
+      ``dates``.
+    :last_start: Start of the latest created occurrence. Later runs only
+      create the occurrences after it.
+    :materialized_dates: Custom dates, that have been created already, one
+      per line. Dates can be added in between, while cancelled or moved
+      occurrences aren't created again.
+    :is_active: Checkbox to pause the rule.
+
+    """
+    FREQUENCY_CHOICES = (
+        ('weekly', _('Weekly')),
+        ('monthly', _('Monthly')),
+        ('dates', _('Custom dates')),
+    )
+
+    #: Fields, that are not copied from the template to the occurrences.
+    OCCURRENCE_EXCLUDED_FIELDS = ('id', 'slug', 'start', 'end',
+                                  'template_name', 'creation_date',
+                                  'last_modified', 'reserved_seats',
+                                  'recurrence_rule')
+
+    template = models.ForeignKey(
+        'event_rsvp.Event',
+        verbose_name=_('Template'),
+        related_name='recurrence_rules',
+        limit_choices_to={'template_name__gt': ''},
+    )
+
+    frequency = models.CharField(
+        max_length=16,
+        verbose_name=_('Frequency'),
+        choices=FREQUENCY_CHOICES,
+        default='weekly',
+    )
+
+    interval = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_('Interval'),
+        help_text=_('Amount of weeks or months between two events.'),
+    )
+
+    first_start = models.DateTimeField(
+        verbose_name=_('First start'),
+    )
+
+    until = models.DateTimeField(
+        verbose_name=_('Until'),
+        blank=True, null=True,
+    )
+
+    dates = models.TextField(
+        verbose_name=_('Dates'),
+        blank=True,
+        help_text=_('Start dates of the events, one per line.'),
+    )
+
+    last_start = models.DateTimeField(
+        verbose_name=_('Last start'),
+        blank=True, null=True,
+        editable=False,
+    )
+
+    materialized_dates = models.TextField(
+        verbose_name=_('Materialized dates'),
+        blank=True,
+        editable=False,
+    )
+
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name=_('Active'),
+    )
+
+    objects = RecurrenceRuleManager()
+
+    def __unicode__(self):
+        return u'{0} ({1})'.format(self.template, self.get_frequency_display())
+
+    def clean(self):
+        if self.template_id and not self.template.template_name:
+            raise exceptions.ValidationError(
+                _('Recurrence rules can only be added to templates.'))
+        if self.frequency == 'dates':
+            if not self.dates.strip():
+                raise exceptions.ValidationError(_('Please enter the dates.'))
+            try:
+                self.get_dates()
+            except (TypeError, ValueError):
+                # Older versions of dateutil raise a ``TypeError``
+                raise exceptions.ValidationError(
+                    _('Please enter one valid date per line.'))
+        if self.interval < 1:
+            raise exceptions.ValidationError(
+                _('The interval must be at least 1.'))
+
+    def get_dates(self):
+        """
+        Returns the custom start dates.
+
+        Dates without a time start at the time of ``first_start``.
+
+        :raises ValueError: If a line isn't a valid date. Older versions of
+          dateutil raise a ``TypeError`` instead.
+
+        """
+        default = to_local(self.first_start).replace(second=0, microsecond=0)
+        return sorted([from_local(parser.parse(line, default=default))
+                       for line in self.dates.splitlines() if line.strip()])
+
+    def get_starts(self, after, until):
+        """
+        Returns the starts of the occurrences after ``after`` up to ``until``.
+
+        ``after`` may be ``None`` to start with the first occurrence.
+
+        """
+        if self.until and self.until < until:
+            until = self.until
+        if self.frequency == 'dates':
+            starts = self.get_dates()
+        elif until < self.first_start:
+            starts = []
+        else:
+            # Recur in local time, so the events keep their time across DST
+            starts = [from_local(start) for start in rrule.rrule(
+                rrule.MONTHLY if self.frequency == 'monthly' else rrule.WEEKLY,
+                interval=self.interval, dtstart=to_local(self.first_start),
+                until=to_local(until))]
+        return [start for start in starts
+                if (after is None or start > after) and start <= until]
+
+    def materialize(self, until):
+        """
+        Creates the missing occurrences up to ``until`` with one query.
+
+        The slugs are allocated in one pass. Returns the created events.
+
+        """
+        if self.frequency == 'dates':
+            # Dates may be added before the latest occurrence later on. Those
+            # are only created, if they are still ahead.
+            now = timezone.now()
+            materialized = set(self.materialized_dates.split())
+            starts = [start for start in self.get_starts(None, until)
+                      if format_start(start) not in materialized
+                      and (self.last_start is None
+                           or start > self.last_start or start > now)]
+        else:
+            starts = self.get_starts(self.last_start, until)
+        if not starts:
+            return []
+        template = self.template
+        values = dict(
+            (field.attname, getattr(template, field.attname))
+            for field in Event._meta.fields
+            if field.name not in self.OCCURRENCE_EXCLUDED_FIELDS)
+        duration = template.end - template.start
+        for attempt in range(3):
+            events = [Event(
+                slug=slug, start=start, end=start + duration,
+                recurrence_rule=self, **values)
+                for slug, start in zip(Event.allocate_slugs(
+                    template.title, len(starts)), starts)]
+            sid = transaction.savepoint()
+            try:
+                Event.objects.bulk_create(events)
+            except IntegrityError:
+                # A slug has been taken by a concurrent save
+                transaction.savepoint_rollback(sid)
+                if attempt == 2:
+                    raise
+            else:
+                transaction.savepoint_commit(sid)
+                break
+        self.last_start = max(starts[-1], self.last_start or starts[-1])
+        if self.frequency == 'dates':
+            self.materialized_dates = '\n'.join(sorted(materialized | set(
+                [format_start(start) for start in starts])))
+        RecurrenceRule.objects.filter(pk=self.pk).update(
+            last_start=self.last_start,
+            materialized_dates=self.materialized_dates)
+        return events
+
+
+#: Fields of the archive, that are not copied from the archived objects.
+ARCHIVE_EXCLUDED_FIELDS = ('id', 'original_id', 'archive_date')
+
+
+class ArchivedEventManager(models.Manager):
+    """Custom manager for the ``ArchivedEvent`` model."""
+    def archive(self, before, batch_size=100,
+                max_attempts=OUTBOX_MAX_ATTEMPTS):
+        """
+        Moves the events, that ended before ``before``, to the archive.
+
+        The events are moved together with their guests in chunks of
+        ``batch_size`` events, each in its own transaction. Templates and
+        events with outbox messages, that are still to be delivered, are
+        kept. Messages, that failed ``max_attempts`` times, are deleted.
+        Returns the amount of archived events and guests.
+
+        """
+        events = Event.objects.filter(
+            end__lt=before, template_name='').exclude(
+                pk__in=OutboxMessage.objects.filter(
+                    attempts__lt=max_attempts).values('event')).order_by('pk')
+        guest_fields = [field for field in ArchivedGuest._meta.fields
+                        if field.name not in ARCHIVE_EXCLUDED_FIELDS]
+        using = Event.objects.db
+        event_count = guest_count = 0
+        while True:
+            with transaction.commit_on_success():
+                chunk = list(events.select_for_update()[:batch_size])
+                if not chunk:
+                    break
+                pks = [event.pk for event in chunk]
+                bulk_create_in_batches(ArchivedEvent, [
+                    ArchivedEvent.from_event(event) for event in chunk],
+                    batch_size)
+                # The database may reuse the ids of deleted events, so an id
+                # may have been archived before. The rows of this chunk are
+                # the latest ones.
+                event_ids = dict(self.filter(original_id__in=pks).order_by(
+                    'pk').values_list('original_id', 'pk'))
+                guests = [ArchivedGuest(
+                    original_id=values['id'],
+                    event_id=event_ids[values['event']], **dict(
+                        (field.attname, values[field.name])
+                        for field in guest_fields if field.name != 'event'))
+                    for values in Guest.objects.filter(event__in=pks).values(
+                        'id', *[field.name for field in guest_fields]
+                    ).iterator()]
+                bulk_create_in_batches(ArchivedGuest, guests, 500)
+                # Delete without loading the rows and sending the signals of
+                # every guest, the seats of past events don't matter anymore
+                for model, field in ((OutboxMessage, 'event'),
+                                     (WaitlistEntry, 'event'),
+                                     (Guest, 'event'), (Event, 'id')):
+                    sql.DeleteQuery(model).delete_batch(
+                        pks, using, field=model._meta.get_field(field))
+            event_count += len(chunk)
+            guest_count += len(guests)
+        return event_count, guest_count
+
+
+class ArchivedEvent(models.Model):
+    """
+    An event, that has been moved out of the ``Event`` table.
+
+    Archived events are still shown by the ``EventDetailView``, but they
+    cannot be booked or changed anymore.
+
+    :original_id: Id of the event in the ``Event`` table. The database may
+      reuse it for a new event, so it is not unique.
+    :archive_date: Date, the event has been archived.
+
+    All other fields are copied from the ``Event``. See its documentation.
+
+    """
+    original_id = models.PositiveIntegerField(
+        verbose_name=_('Original ID'),
+        db_index=True,
+    )
+
+    created_by = models.ForeignKey(
+        'auth.User',
+        verbose_name=_('Created by'),
+        related_name='rsvp_archived_events',
+    )
+
+    creation_date = models.DateTimeField(
+        verbose_name=_('Creation date'),
+    )
+
+    title = models.CharField(
+        max_length=256,
+        verbose_name=_('Title'),
+    )
+
+    # Not unique, the slug may be taken again by a new event
+    slug = models.SlugField(
+        max_length=256,
+        verbose_name=_('Slug'),
+    )
+
+    description = models.TextField(
+        max_length=1000,
+        verbose_name=_('Description'),
+        blank=True, null=True,
+    )
+
+    start = models.DateTimeField(
+        verbose_name=_('Start date'),
+    )
+
+    end = models.DateTimeField(
+        verbose_name=_('End date'),
+    )
+
+    venue = models.CharField(
+        max_length=100,
+        verbose_name=_('Venue'),
+    )
+
+    street = models.CharField(
+        max_length=100,
+        verbose_name=_('Street'),
+        blank=True,
+    )
+
+    city = models.CharField(
+        max_length=100,
+        verbose_name=_('City'),
+        blank=True,
+    )
+
+    zip = models.CharField(
+        max_length=100,
+        verbose_name=_('ZIP code'),
+        blank=True,
+    )
+
+    country = models.CharField(
+        max_length=100,
+        verbose_name=_('Country'),
+        blank=True,
+    )
+
+    contact_person = models.CharField(
+        max_length=100,
+        verbose_name=_('Contact name'),
+        blank=True,
+    )
+
+    contact_email = models.EmailField(
+        verbose_name=_('Contact email'),
+        blank=True,
+    )
+
+    contact_phone = models.CharField(
+        max_length=100,
+        verbose_name=_('Contact phone'),
+        blank=True,
+    )
+
+    available_seats = models.PositiveIntegerField(
+        verbose_name=_('Available seats'),
+        blank=True, null=True,
+    )
+
+    reserved_seats = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Reserved seats'),
+    )
+
+    hide_available_seats = models.BooleanField(
+        default=False,
+        verbose_name=_('Hide available seat information'),
+    )
+
+    allow_anonymous_rsvp = models.BooleanField(
+        default=False,
+        verbose_name=_('Allow anonymous RSVP'),
+    )
+
+    required_fields = BitMaskMultiSelectField(
+        verbose_name=_('Required fields'),
+        blank=True,
+        choices=REQUIRED_FIELDS_CHOICES,
+    )
+
+    max_seats_per_guest = models.PositiveIntegerField(
+        blank=True, null=True,
+        verbose_name=_('Maximum amount of seats per guest'),
+    )
+
+    is_published = models.BooleanField(
+        verbose_name=_('is published'),
+        default=False,
+    )
+
+    last_modified = models.DateTimeField(
+        verbose_name=_('Last modified'),
+    )
+
+    image = FilerImageField(
+        verbose_name=_('Image'),
+        related_name='rsvp_archived_event_images',
+        null=True, blank=True,
+    )
+
+    archive_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Archive date'),
+    )
+
+    objects = ArchivedEventManager()
+
+    class Meta:
+        ordering = ('-start', )
+
+    def __unicode__(self):
+        return '{0} ({1})'.format(self.title, date(self.start))
+
+    @classmethod
+    def from_event(cls, event):
+        """Returns an unsaved copy of ``event``."""
+        return cls(original_id=event.pk, **dict(
+            (field.attname, getattr(event, field.attname))
+            for field in cls._meta.fields
+            if field.name not in ARCHIVE_EXCLUDED_FIELDS))
+
+    def get_absolute_url(self):
+        return reverse('rsvp_event_detail', kwargs={
+            'slug': self.slug,
+            'year': '{0:04d}'.format(self.start.year),
+            'month': '{0:02d}'.format(self.start.month),
+            'day': '{0:02d}'.format(self.start.day),
+        })
+
+    def get_free_seats(self):
+        if self.available_seats:
+            return self.available_seats - self.reserved_seats
+        return _('Unlimited seats available.')
+
+    def is_bookable(self):
+        return False
+
+
+class ArchivedGuest(models.Model):
+    """
+    A guest of an ``ArchivedEvent``.
+
+    :original_id: Id of the guest in the ``Guest`` table. The database may
+      reuse it for a new guest, so it is not unique.
+    :archive_date: Date, the guest has been archived.
+
+    All other fields are copied from the ``Guest``. See its documentation.
+
+    """
+    original_id = models.PositiveIntegerField(
+        verbose_name=_('Original ID'),
+        db_index=True,
+    )
+
+    event = models.ForeignKey(
+        'event_rsvp.ArchivedEvent',
+        verbose_name=_('Event'),
+        related_name='guests',
+    )
+
+    user = models.ForeignKey(
+        'auth.User',
+        verbose_name=_('User'),
+        related_name='rsvp_archived_guests',
+        blank=True, null=True,
+    )
+
+    name = models.CharField(
+        max_length=50,
+        verbose_name=_('Name'),
+        blank=True,
+    )
+
+    email = models.EmailField(
+        verbose_name=_('Email'),
+        blank=True,
+    )
+
+    phone = models.CharField(
+        max_length=50,
+        verbose_name=_('Phone'),
+        blank=True,
+    )
+
+    number_of_seats = models.PositiveIntegerField(
+        verbose_name=_('Number of seats'),
+        blank=True, null=True,
+    )
+
+    creation_date = models.DateTimeField(
+        verbose_name=_('Creation date'),
+    )
+
+    is_attending = models.BooleanField(
+        verbose_name=_('Attending'),
+        default=True,
+    )
+
+    message = models.TextField(
+        verbose_name=_('Message'),
+        max_length=4000,
+        blank=True,
+    )
+
+    archive_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Archive date'),
+    )
+
+    def __unicode__(self):
+        return '{0} - {1}'.format(self.get_name(), self.event)
+
+    def get_name(self):
+        """Returns the name of the guest without touching the event."""
+        if self.user:
+            return self.user.get_full_name() or self.user.email
+        return self.name or self.email or ugettext('anonymous')
+
+
+@receiver(post_save, sender=Guest)
+def guest_enqueue_post_guest_create(sender, instance, created, **kwargs):
+    """
+    Writes the ``OutboxMessage`` of a guest, that has been created by
+    ``GuestCreateView`` with ``EVENT_RSVP_USE_OUTBOX`` set.
+
+    ``Guest.save`` commits its own transaction, so the message is written
+    here to be part of it.
+
+    """
+    if created and getattr(instance, 'enqueue_post_guest_create', False):
+        OutboxMessage.objects.create(
+            guest=instance, event_id=instance.event_id,
+            user_id=instance.user_id)
+
+
+class DeletedEvents(threading.local):
+    """Ids of the events, that are being deleted by the current thread."""
+    def __init__(self):
+        self.ids = set()
+
+
+_deleted_events = DeletedEvents()
+
+
+@receiver(pre_delete, sender=Event)
+def event_pre_delete(sender, instance, **kwargs):
+    """
+    Marks the event as deleted.
+
+    The collector deletes the guests of the event before the event itself, so
+    ``guest_post_delete`` must not promote waiting people into it.
+
+    """
+    _deleted_events.ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def event_post_delete(sender, instance, **kwargs):
+    _deleted_events.ids.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Guest)
+def guest_post_delete(sender, instance, **kwargs):
+    """Releases the seats of a deleted guest and promotes waiting people."""
+    seats = instance.get_reserved_seats()
+    if not seats or instance.event_id in _deleted_events.ids:
+        return
+    try:
+        event = instance._event_cache
+    except AttributeError:
+        # Don't fetch the event, the counter can be updated without it
+        Event.objects.filter(pk=instance.event_id).update(
+            reserved_seats=models.F('reserved_seats') - seats)
+    else:
+        event.update_reserved_seats(-seats)
+    WaitlistEntry.objects.promote(instance.event_id)
+    from .seats import publish_seat_stats
+    publish_seat_stats(instance.event_id)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Guest)
+@receiver(post_delete, sender=Guest)
+def invalidate_upcoming_events(sender, **kwargs):
+    """Removes the cached upcoming events of the ``CMSEventPlugin``."""
+    cache.delete(UPCOMING_EVENTS_CACHE_KEY)
@@ -0,0 +1,153 @@
+"""Keyset pagination for the views of the ``event_rsvp`` app."""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import QueryDict
+
+
+class KeysetPage(object):
+    """
+    A page of objects, that has been fetched by ``get_keyset_page``.
+
+    :object_list: The objects on this page.
+    :prefix: Prefix of the ``after`` and ``before`` GET parameters.
+    :next_cursor: Cursor pointing to the page after this one or ``None``.
+    :previous_cursor: Cursor pointing to the page before this one or ``None``.
+    :query: The GET parameters of the current request. The cursors of the
+      other lists on the page are kept in the links of this one.
+
+    """
+    def __init__(self, object_list, prefix='', next_cursor=None,
+                 previous_cursor=None, query=None):
+        self.object_list = object_list
+        self.prefix = prefix
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def get_query(self, name, cursor):
+        """
+        Returns the query string with ``cursor`` as the ``name`` parameter.
+
+        The ``after`` and ``before`` parameters of this list are replaced,
+        all other parameters are kept.
+
+        """
+        query = self.query.copy() if self.query is not None else QueryDict(
+            '', mutable=True)
+        for key in ('after', 'before'):
+            query.pop('{0}{1}'.format(self.prefix, key), None)
+        query['{0}{1}'.format(self.prefix, name)] = cursor
+        return query.urlencode()
+
+    def get_next_query(self):
+        return self.get_query('after', self.next_cursor)
+
+    def get_previous_query(self):
+        return self.get_query('before', self.previous_cursor)
+
+
+def get_field(model, path):
+    """Returns the model field for a lookup path like ``event__start``."""
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if field.rel:
+            model = field.rel.to
+    return field
+
+
+def encode_cursor(obj, field):
+    """Returns the cursor of ``obj`` for the ordering ``(field, pk)``."""
+    value = obj
+    for name in field.split('__'):
+        value = getattr(value, name)
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(u'{0}|{1}'.format(
+        value, obj.pk).encode('utf-8'))
+
+
+def decode_cursor(model, field, cursor):
+    """
+    Returns the ``(value, pk)`` tuple, that has been encoded in ``cursor``.
+
+    Returns ``None`` if the cursor is invalid.
+
+    """
+    try:
+        value, pk = base64.urlsafe_b64decode(
+            cursor.encode('utf-8')).decode('utf-8').rsplit(u'|', 1)
+        return get_field(model, field).to_python(value), int(pk)
+    except (binascii.Error, TypeError, ValueError, UnicodeError):
+        return None
+
+
+def get_keyset_page(queryset, page_size, field, after=None, before=None,
+                    descending=False, prefix='', query=None):
+    """
+    Returns a ``KeysetPage`` of ``queryset`` ordered by ``(field, pk)``.
+
+    Instead of an OFFSET the page is selected with a ``WHERE`` clause on the
+    ordering columns, so deep pages are as cheap as the first one.
+
+    :param queryset: The queryset to paginate.
+    :param page_size: Maximum amount of objects on the page.
+    :param field: Name of the field to order by, e.g. ``start``.
+    :param after: Cursor of the object, after which the page starts.
+    :param before: Cursor of the object, before which the page ends. It is
+      ignored, if ``after`` is given as well.
+    :param descending: If ``True`` the page is ordered by ``(-field, -pk)``.
+    :param prefix: Prefix of the GET parameters, that hold the cursors.
+    :param query: The GET parameters, that are kept in the page links.
+
+    """
+    # The direction comes from the same cursor as the position, ``after``
+    # wins if both are given
+    forward = bool(after) or not before
+    if after:
+        position = decode_cursor(queryset.model, field, after)
+    elif before:
+        position = decode_cursor(queryset.model, field, before)
+    else:
+        position = None
+    # Walk backwards through the ordering for the previous page
+    reverse = descending == forward
+    lookup = 'lt' if reverse else 'gt'
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(
+            Q(**{'{0}__{1}'.format(field, lookup): value})
+            | Q(**{field: value, 'pk__{0}'.format(lookup): pk}))
+    if reverse:
+        ordering = ('-{0}'.format(field), '-pk')
+    else:
+        ordering = (field, 'pk')
+    object_list = list(queryset.order_by(*ordering)[:page_size + 1])
+    has_more = len(object_list) > page_size
+    object_list = object_list[:page_size]
+    if not forward:
+        object_list.reverse()
+    page = KeysetPage(object_list, prefix=prefix, query=query)
+    if not object_list:
+        return page
+    if (has_more and forward) or (not forward and position is not None):
+        page.next_cursor = encode_cursor(object_list[-1], field)
+    if (has_more and not forward) or (forward and position is not None):
+        page.previous_cursor = encode_cursor(object_list[0], field)
+    return page
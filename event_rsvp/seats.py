@@ -0,0 +1,178 @@
+"""Micro-cached seat availability of the events of the ``event_rsvp`` app."""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import settings
+from .broker import get_broker
+from .models import Event
+
+
+#: Stale stats are kept this many intervals, while they are being refreshed.
+SEATS_STALE_FACTOR = 10
+
+#: Requests, that miss the stats of an event, while another request fetches
+#: them, re-read the cache this many times before they read the database.
+SEATS_LOCK_RETRIES = 10
+
+#: Seconds to wait between two reads of ``SEATS_LOCK_RETRIES``.
+SEATS_LOCK_DELAY = 0.05
+
+
+def get_cache_key(slug):
+    """Returns the cache key of the seat stats of an event."""
+    # Slugs may be longer than the 250 characters, memcached allows
+    return 'event_rsvp_seats_{0}'.format(
+        hashlib.md5(slug.encode('utf-8')).hexdigest())
+
+
+#: Fields of the events, that are needed by ``get_stats``.
+SEATS_EVENT_FIELDS = ('slug', 'start', 'hide_available_seats',
+                      'available_seats', 'reserved_seats')
+
+
+def get_stats(event):
+    """Returns the seat stats of an event, given as ``values()`` dict."""
+    free_seats = None
+    if event['available_seats']:
+        free_seats = event['available_seats'] - event['reserved_seats']
+    stats = {
+        'is_bookable': event['start'] >= timezone.now(),
+        'is_fully_booked': free_seats is not None and free_seats <= 0,
+        'available_seats': None,
+        'reserved_seats': None,
+        'free_seats': None,
+    }
+    if not event['hide_available_seats']:
+        stats.update({
+            'available_seats': event['available_seats'] or None,
+            'reserved_seats': event['reserved_seats'],
+            'free_seats': free_seats,
+        })
+    return stats
+
+
+def fetch_stats(slugs):
+    """
+    Returns a dict with the seat stats of the given slugs read from the
+    database. The value of unknown or unpublished events is ``None``.
+
+    """
+    stats = dict((slug, None) for slug in slugs)
+    for event in Event.objects.filter(
+            slug__in=slugs, is_published=True).values(*SEATS_EVENT_FIELDS):
+        stats[event['slug']] = get_stats(event)
+    return stats
+
+
+def get_seat_stats(slugs):
+    """
+    Returns a dict with the seat stats of the published events by slug.
+
+    The stats of all events are fetched with one query and cached for
+    ``EVENT_RSVP_SEATS_CACHE_TIMEOUT`` seconds. Only the request, that gets
+    the lock of an event, fetches its stats. Once they are outdated, all
+    other requests keep getting the stale stats. If they are not cached at
+    all, the other requests wait briefly for them and read them from the
+    database, if they don't arrive in time. So many clients polling the same
+    events cause at most one query per interval, unless the cache is cold
+    and the database slow.
+
+    """
+    timeout = settings.SEATS_CACHE_TIMEOUT
+    keys = dict((get_cache_key(slug), slug) for slug in set(slugs))
+    cached = cache.get_many(keys.keys())
+    now = time.time()
+    stats = {}
+    refresh = []
+    waiting = []
+    for key, slug in keys.items():
+        if key in cached:
+            fresh_until, stats[slug] = cached[key]
+            if fresh_until > now:
+                continue
+        if not cache.add('{0}_lock'.format(key), True, timeout):
+            if key not in cached:
+                # Another request is fetching the stats right now
+                waiting.append(key)
+            continue
+        refresh.append(slug)
+    if refresh:
+        fresh = fetch_stats(refresh)
+        cache.set_many(dict(
+            (get_cache_key(slug), (now + timeout, value))
+            for slug, value in fresh.items()), timeout * SEATS_STALE_FACTOR)
+        cache.delete_many(['{0}_lock'.format(get_cache_key(slug))
+                           for slug in refresh])
+        stats.update(fresh)
+    for attempt in range(SEATS_LOCK_RETRIES):
+        if not waiting:
+            break
+        time.sleep(SEATS_LOCK_DELAY)
+        for key, (fresh_until, value) in cache.get_many(waiting).items():
+            stats[keys[key]] = value
+            waiting.remove(key)
+    if waiting:
+        # The request holding the lock is too slow, so the stats of an
+        # existing event are never missing from the result
+        stats.update(fetch_stats([keys[key] for key in waiting]))
+    return dict((slug, value) for slug, value in stats.items()
+                if value is not None)
+
+
+def publish_seat_stats(event_id):
+    """
+    Sends the current seat stats of an event to the subscribers of its
+    stream and updates the cached stats.
+
+    The stats are read once per change, no matter how many subscribers
+    there are.
+
+    Django 1.4 has no commit hooks, so the stats are published as soon as
+    they have been written. Inside a transaction of the caller, they can be
+    published before it is committed or even if it is rolled back. The next
+    change of the event publishes the correct stats again.
+
+    """
+    broker = get_broker()
+    if broker is None or not broker.has_subscribers(event_id):
+        return
+    timeout = settings.SEATS_CACHE_TIMEOUT
+    for event in Event.objects.filter(
+            pk=event_id, is_published=True).values(*SEATS_EVENT_FIELDS):
+        stats = get_stats(event)
+        cache.set(get_cache_key(event['slug']),
+                  (time.time() + timeout, stats), timeout * SEATS_STALE_FACTOR)
+        broker.publish(event_id, stats)
+
+
+def format_event(data):
+    """Returns ``data`` as ``seats`` message of a server-sent event stream."""
+    return 'event: seats\ndata: {0}\n\n'.format(json.dumps(data))
+
+
+def iter_seat_stream(broker, event_id, stats):
+    """
+    Yields the server-sent events with the seat stats of an event.
+
+    The stream starts with the current ``stats`` and is closed after
+    ``EVENT_RSVP_SSE_MAX_DURATION`` seconds. Browsers reconnect on their
+    own, so a worker is never blocked forever.
+
+    """
+    yield 'retry: 3000\n'
+    yield format_event(stats)
+    closes_at = time.time() + settings.SSE_MAX_DURATION
+    if time.time() >= closes_at:
+        return
+    for data in broker.listen(event_id, settings.SSE_KEEPALIVE):
+        if data is None:
+            # Keeps proxies from closing an idle connection
+            yield ': keepalive\n\n'
+        else:
+            yield format_event(data)
+        if time.time() >= closes_at:
+            break
@@ -15,3 +15,43 @@ REQUIRED_FIELDS_CHOICES = getattr(
 
 GUEST_FORM = getattr(settings, 'EVENT_RSVP_GUEST_FORM',
                      'event_rsvp.forms.base.GuestForm')
+
+PAGINATE_BY = getattr(settings, 'EVENT_RSVP_PAGINATE_BY', 20)
+
+PLUGIN_EVENT_COUNT = getattr(settings, 'EVENT_RSVP_PLUGIN_EVENT_COUNT', 3)
+
+PLUGIN_CACHE_TIMEOUT = getattr(
+    settings, 'EVENT_RSVP_PLUGIN_CACHE_TIMEOUT', 300)
+
+SEATS_CACHE_TIMEOUT = getattr(settings, 'EVENT_RSVP_SEATS_CACHE_TIMEOUT', 5)
+
+SEATS_MAX_EVENTS = getattr(settings, 'EVENT_RSVP_SEATS_MAX_EVENTS', 100)
+
+#: Dotted path of the broker class of the seat stream, e.g.
+#: ``event_rsvp.broker.LocalBroker``. The stream is disabled, if ``None``.
+SSE_BROKER = getattr(settings, 'EVENT_RSVP_SSE_BROKER', None)
+
+SSE_KEEPALIVE = getattr(settings, 'EVENT_RSVP_SSE_KEEPALIVE', 15)
+
+#: Seconds, after which a stream is closed and the browser reconnects.
+SSE_MAX_DURATION = getattr(settings, 'EVENT_RSVP_SSE_MAX_DURATION', 300)
+
+#: If ``True``, ``post_guest_create`` is not sent by ``GuestCreateView`` but
+#: by the ``rsvp_process_outbox`` management command.
+USE_OUTBOX = getattr(settings, 'EVENT_RSVP_USE_OUTBOX', False)
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'EVENT_RSVP_OUTBOX_BATCH_SIZE', 100)
+
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'EVENT_RSVP_OUTBOX_MAX_ATTEMPTS', 5)
+
+#: Share of the requests between 0 and 1, whose queries are recorded by the
+#: ``QueryBudgetMiddleware``. In debug mode every request is recorded.
+QUERY_SAMPLE_RATE = getattr(settings, 'EVENT_RSVP_QUERY_SAMPLE_RATE', 0)
+
+#: Days ahead, up to which ``rsvp_materialize_recurrences`` creates events.
+RECURRENCE_HORIZON = getattr(settings, 'EVENT_RSVP_RECURRENCE_HORIZON', 90)
+
+#: Days after their end, after which ``rsvp_archive_events`` archives events.
+ARCHIVE_AFTER = getattr(settings, 'EVENT_RSVP_ARCHIVE_AFTER', 365)
+
+ARCHIVE_BATCH_SIZE = getattr(settings, 'EVENT_RSVP_ARCHIVE_BATCH_SIZE', 100)
@@ -1,4 +1,11 @@
 """Signals for the event_rsvp app."""
 from django import dispatch
 
-post_guest_create = dispatch.Signal(providing_args=['user', 'event'])
+#: Sent by ``GuestCreateView`` with the ``request`` or, if
+#: ``EVENT_RSVP_USE_OUTBOX`` is set, by the ``rsvp_process_outbox`` command
+#: with ``request=None``, the new ``guest`` and an open email ``connection``.
+post_guest_create = dispatch.Signal(
+    providing_args=['request', 'user', 'event', 'guest', 'connection'])
+
+post_waitlist_promote = dispatch.Signal(
+    providing_args=['entry', 'guest', 'user', 'event'])
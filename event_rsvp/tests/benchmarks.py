@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the views and model hot paths of the ``event_rsvp`` app.
+
+Like ``runtests.py`` this script sets up a fake Django environment. It fills
+a test database with scale fixtures, then times every benchmark and counts
+its queries. The results are written as JSON, so runs of different commits
+can be compared::
+
+    $ python event_rsvp/tests/benchmarks.py --output=master.json
+    $ git checkout feature_branch
+    $ python event_rsvp/tests/benchmarks.py --compare=master.json
+
+The script exits with status 1, if a benchmark of ``--compare`` needs more
+queries than before. Timings are only reported, because they depend on the
+machine.
+
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+from django.conf import settings
+import test_settings
+
+
+if not settings.configured:
+    settings.configure(**test_settings.__dict__)
+
+
+import django
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries, transaction
+from django.test.client import Client
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from event_rsvp.indexes import create_indexes
+from event_rsvp.models import Event, Guest, get_bulk_batch_size
+from event_rsvp.tests.factories import EventFactory, StaffFactory
+
+
+#: Password of the staff member, who is logged in by the staff benchmarks.
+STAFF_PASSWORD = 'test'
+
+
+def create_fixtures(events, guests, batch_size):
+    """
+    Creates ``events`` events and ``guests`` guests spread over them.
+
+    Half of the events are in the past. Every 10th event is a draft, every
+    100th a template and every 4th has unlimited seats. The staff member,
+    who is returned, attends every 100th guest entry.
+
+    """
+    staff = StaffFactory()
+    staff.set_password(STAFF_PASSWORD)
+    staff.save()
+    now = timezone.now()
+    with transaction.commit_on_success():
+        # All events share a title, so slug allocation has to skip them all
+        slugs = Event.allocate_slugs('Event', events)
+        per_event = guests // max(events, 1) + 1
+        objs = [Event(
+            created_by=staff, title='Event', slug=slug, venue='Bar',
+            start=now + timezone.timedelta(hours=i - events // 2),
+            end=now + timezone.timedelta(hours=i - events // 2 + 2),
+            available_seats=None if i % 4 == 0 else per_event * 2,
+            is_published=i % 10 != 0,
+            template_name='Template {0}'.format(i) if i % 100 == 0 else '',
+        ) for i, slug in enumerate(slugs)]
+        # Django 1.4 inserts all objects of ``bulk_create`` with one query
+        event_batch_size = get_bulk_batch_size(Event, batch_size)
+        for start in xrange(0, len(objs), event_batch_size):
+            Event.objects.bulk_create(objs[start:start + event_batch_size])
+        event_ids = list(Event.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        guest_batch_size = get_bulk_batch_size(Guest, batch_size)
+        chunk = []
+        for i in xrange(guests):
+            chunk.append(Guest(
+                event_id=event_ids[i % events],
+                user_id=staff.pk if i % 100 == 0 else None,
+                name='Guest {0}'.format(i),
+                email='guest{0}@example.com'.format(i),
+                number_of_seats=1, is_attending=i % 5 != 0))
+            if len(chunk) >= guest_batch_size:
+                Guest.objects.bulk_create(chunk)
+                chunk = []
+        if chunk:
+            Guest.objects.bulk_create(chunk)
+    # ``bulk_create`` doesn't maintain the counters
+    call_command('rsvp_rebuild_seat_counters', verbosity=0)
+    create_indexes(connection)
+    return staff
+
+
+def get_request(client, url, method='get', data=None, status_code=200):
+    """Returns a function, that requests ``url`` and checks the status."""
+    def request():
+        response = getattr(client, method)(url, data=data or {})
+        if response.status_code != status_code:
+            raise AssertionError('{0} {1} returned {2}, expected {3}.'.format(
+                method.upper(), url, response.status_code, status_code))
+        # Consume streamed responses, too
+        response.content
+    return request
+
+
+def get_benchmarks(staff):
+    """Returns a list of ``(name, function)`` tuples of all benchmarks."""
+    now = timezone.now()
+    anonymous = Client()
+    staff_client = Client()
+    staff_client.login(username=staff.username, password=STAFF_PASSWORD)
+    upcoming = Event.objects.filter(
+        start__gt=now, is_published=True, available_seats__isnull=False
+    ).order_by('start')[0]
+    unlimited = Event.objects.filter(
+        start__gt=now, is_published=True, available_seats__isnull=True
+    ).order_by('start')[0]
+
+    def save_event():
+        EventFactory(created_by=staff, title='Event')
+
+    def get_free_seats():
+        Event.objects.get(pk=upcoming.pk).get_free_seats()
+
+    return [
+        ('event_list_anonymous',
+         get_request(anonymous, reverse('rsvp_event_list'))),
+        ('event_list_staff',
+         get_request(staff_client, reverse('rsvp_event_list'))),
+        ('event_detail_public',
+         get_request(anonymous, upcoming.get_absolute_url())),
+        ('event_detail_staff',
+         get_request(staff_client, upcoming.get_absolute_url())),
+        ('staff_dashboard',
+         get_request(staff_client, reverse('rsvp_event_staff'))),
+        ('guest_create_post', get_request(
+            staff_client, reverse('rsvp_guest_create', kwargs={
+                'event_slug': unlimited.slug}),
+            method='post', status_code=302, data={
+                'name': 'Benchmark', 'email': 'benchmark@example.com',
+                'number_of_seats': 1, 'is_attending': 'on'})),
+        ('event_save_slug_allocation', save_event),
+        ('event_get_free_seats', get_free_seats),
+    ]
+
+
+def run_benchmark(function, repeat):
+    """
+    Calls ``function`` ``repeat`` times.
+
+    Returns a dict with the query count of the last call and the minimum,
+    mean and maximum duration in milliseconds.
+
+    """
+    function()  # Warm up the caches of Django and the database
+    durations = []
+    for i in range(repeat):
+        reset_queries()
+        start = time.time()
+        function()
+        durations.append((time.time() - start) * 1000)
+    return {
+        'queries': len(connection.queries),
+        'min_ms': round(min(durations), 3),
+        'mean_ms': round(sum(durations) / len(durations), 3),
+        'max_ms': round(max(durations), 3),
+    }
+
+
+def get_commit():
+    """Returns the current git commit or ``None``."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """
+    Prints the changes between ``previous`` and ``results``.
+
+    Returns ``True``, if any benchmark needs more queries than before.
+
+    """
+    regression = False
+    sys.stdout.write('{0:<32} {1:>10} {2:>10} {3:>8} {4:>9}\n'.format(
+        'benchmark', 'before ms', 'after ms', 'change', 'queries'))
+    for name, result in sorted(results['results'].items()):
+        before = previous['results'].get(name)
+        if before is None:
+            continue
+        change = (result['mean_ms'] / before['mean_ms'] - 1 if
+                  before['mean_ms'] else 0)
+        queries = '{0} -> {1}'.format(before['queries'], result['queries'])
+        if result['queries'] > before['queries']:
+            regression = True
+            queries += ' !'
+        sys.stdout.write(
+            '{0:<32} {1:>10.2f} {2:>10.2f} {3:>+7.0%} {4:>9}\n'.format(
+                name, before['mean_ms'], result['mean_ms'], change, queries))
+    return regression
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [benchmark ...]')
+    parser.add_option(
+        '--events', dest='events', type='int', default=10000,
+        help='Amount of events, that are created.')
+    parser.add_option(
+        '--guests', dest='guests', type='int', default=1000000,
+        help='Amount of guests, that are spread over the events.')
+    parser.add_option(
+        '--repeat', dest='repeat', type='int', default=5,
+        help='Amount of timed calls per benchmark.')
+    parser.add_option(
+        '--batch-size', dest='batch_size', type='int', default=500,
+        help='Amount of fixtures, that are inserted with one query. It is'
+             ' capped to the parameter limit of the database.')
+    parser.add_option(
+        '--output', dest='output', default=None,
+        help='File, the JSON results are written to. Defaults to stdout.')
+    parser.add_option(
+        '--compare', dest='compare', default=None,
+        help='JSON results of a previous run to compare with.')
+    options, names = parser.parse_args()
+    if options.events < 1 or options.repeat < 1 or options.batch_size < 1:
+        parser.error('Events, repeat and batch size must be positive.')
+
+    setup_test_environment()
+    # The queries are only logged in debug mode
+    settings.DEBUG = True
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start = time.time()
+        staff = create_fixtures(
+            options.events, options.guests, options.batch_size)
+        sys.stderr.write('Created the fixtures in {0:.1f}s.\n'.format(
+            time.time() - start))
+        results = {}
+        for name, function in get_benchmarks(staff):
+            if names and name not in names:
+                continue
+            results[name] = run_benchmark(function, options.repeat)
+            sys.stderr.write('{0}: {1[mean_ms]:.2f}ms, {1[queries]}'
+                             ' queries\n'.format(name, results[name]))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    results = {
+        'environment': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'scale': {
+            'events': options.events,
+            'guests': options.guests,
+            'repeat': options.repeat,
+        },
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    elif not options.compare:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    if options.compare:
+        with open(options.compare) as previous:
+            if compare(results, json.load(previous)):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
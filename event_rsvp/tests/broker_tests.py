@@ -0,0 +1,79 @@
+"""Tests for the brokers of the ``event_rsvp`` app."""
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from mock import patch
+
+from event_rsvp import broker, settings
+from event_rsvp.broker import CacheBroker, LocalBroker, get_broker
+
+
+class LocalBrokerTestCase(TestCase):
+    """Tests for the ``LocalBroker`` class."""
+    longMessage = True
+
+    def test_broker(self):
+        local = LocalBroker()
+        self.assertFalse(local.has_subscribers(1))
+        messages = local.listen(1, 0.01)
+        self.assertIsNone(next(messages), msg=(
+            'None should be yielded, when the timeout has passed.'))
+        self.assertTrue(local.has_subscribers(1))
+        self.assertFalse(local.has_subscribers(2))
+
+        publisher = threading.Timer(0.01, local.publish, args=(1, 'foo'))
+        publisher.start()
+        messages = local.listen(1, 5)
+        self.assertEqual(next(messages), 'foo', msg=(
+            'Published messages should be yielded to waiting subscribers.'))
+        publisher.join()
+        local.publish(2, 'bar')
+        local.publish(1, 'bar')
+        local.publish(1, 'baz')
+        self.assertEqual(next(messages), 'baz', msg=(
+            'Only the latest message of the channel should be yielded.'))
+
+        messages.close()
+        self.assertFalse(local.has_subscribers(1), msg=(
+            'Closed subscriptions should be removed.'))
+
+
+class CacheBrokerTestCase(TestCase):
+    """Tests for the ``CacheBroker`` class."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+
+    def test_broker(self):
+        shared = CacheBroker()
+        shared.poll_interval = 0.01
+        self.assertFalse(shared.has_subscribers(1))
+        messages = shared.listen(1, 0.01)
+        self.assertIsNone(next(messages))
+        self.assertTrue(CacheBroker().has_subscribers(1), msg=(
+            'Subscribers of other brokers should be known.'))
+        self.assertFalse(shared.has_subscribers(2))
+        CacheBroker().publish(1, 'foo')
+        self.assertEqual(next(messages), 'foo', msg=(
+            'Messages of other brokers should be read from the cache.'))
+
+
+class GetBrokerTestCase(TestCase):
+    """Tests for the ``get_broker`` function."""
+    longMessage = True
+
+    def tearDown(self):
+        broker._broker = None
+
+    def test_function(self):
+        self.assertIsNone(get_broker(), msg=(
+            'No broker should be returned, if the stream is disabled.'))
+        with patch.object(settings, 'SSE_BROKER',
+                          'event_rsvp.broker.LocalBroker'):
+            local = get_broker()
+            self.assertIsInstance(local, LocalBroker)
+            self.assertIs(get_broker(), local, msg=(
+                'The broker should be shared by the whole process.'))
@@ -1,9 +1,10 @@
 """Tests for models of the ``event_rsvp``` application."""
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 
 from ..cms_plugins import CMSEventPlugin
-from .factories import EventFactory
+from .factories import EventFactory, GuestFactory
 
 
 class CMSEventPluginTestCase(TestCase):
@@ -11,6 +12,7 @@ class CMSEventPluginTestCase(TestCase):
     longMessage = True
 
     def setUp(self):
+        cache.clear()
         self.event = EventFactory(start=timezone.now() + timezone.timedelta(
             days=1), is_published=True)
         self.cmsplugin = CMSEventPlugin()
@@ -18,3 +20,21 @@ class CMSEventPluginTestCase(TestCase):
     def test_render(self):
         self.assertEqual(
             self.cmsplugin.render({}, None, None).get('events')[0], self.event)
+
+    def test_cache(self):
+        self.cmsplugin.render({}, None, None)
+        with self.assertNumQueries(0):
+            self.cmsplugin.render({}, None, None)
+
+        # Saving an event invalidates the cache
+        event = EventFactory(start=timezone.now() + timezone.timedelta(
+            hours=1), is_published=True)
+        self.assertEqual(
+            self.cmsplugin.render({}, None, None).get('events')[0], event)
+
+        # Deleting a guest invalidates the cache
+        guest = GuestFactory(event=event)
+        self.cmsplugin.render({}, None, None)
+        guest.delete()
+        with self.assertNumQueries(1):
+            self.cmsplugin.render({}, None, None)
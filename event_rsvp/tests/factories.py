@@ -2,7 +2,7 @@
 from django_libs.tests.factories import UserFactory
 import factory
 
-from event_rsvp.models import Event, Guest
+from event_rsvp.models import Event, Guest, RecurrenceRule, WaitlistEntry
 
 
 class StaffFactory(UserFactory):
@@ -22,3 +22,17 @@ class GuestFactory(factory.django.DjangoModelFactory):
 
     event = factory.SubFactory(EventFactory)
     number_of_seats = 1
+
+
+class WaitlistEntryFactory(factory.django.DjangoModelFactory):
+    FACTORY_FOR = WaitlistEntry
+
+    event = factory.SubFactory(EventFactory)
+    number_of_seats = 1
+
+
+class RecurrenceRuleFactory(factory.django.DjangoModelFactory):
+    FACTORY_FOR = RecurrenceRule
+
+    template = factory.SubFactory(EventFactory, template_name='Foo')
+    first_start = factory.LazyAttribute(lambda rule: rule.template.start)
@@ -1,11 +1,12 @@
 """Tests for the forms of the ``event_rsvp`` app."""
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
 from django_libs.tests.factories import UserFactory
 
-from event_rsvp.forms import EventForm, GuestForm
-from event_rsvp.models import Event, Guest
+from event_rsvp.forms import EventForm, GuestForm, WaitlistEntryForm
+from event_rsvp.models import Event, Guest, WaitlistEntry
 from event_rsvp.tests.factories import EventFactory
 
 
@@ -55,6 +56,87 @@ class EventFormTestCase(TestCase):
         instance = form.save()
         self.assertEqual(instance.street, 'Barstreet')
 
+    def test_save_as_template(self):
+        user = UserFactory()
+        data = {
+            'title': 'Foo',
+            'venue': 'Bar',
+            'start': timezone.now(),
+            'end': timezone.now() + timezone.timedelta(days=11),
+            'template_name': 'Foo',
+        }
+        form = EventForm(data=data, created_by=user)
+        self.assertTrue(form.is_valid())
+        # One query for both slugs and one insert for each event. Each insert
+        # is wrapped in a savepoint, if the database supports them
+        savepoint_queries = 2 if connection.features.uses_savepoints else 0
+        with self.assertNumQueries(3 + 2 * savepoint_queries):
+            instance = form.save()
+        self.assertEqual(instance.slug, 'foo')
+        self.assertEqual(instance.template_name, '')
+        template = Event.objects.get(template_name='Foo')
+        self.assertEqual(template.slug, 'foo-1')
+        self.assertEqual(template.venue, 'Bar')
+        self.assertEqual(template.created_by, user)
+
+        form = EventForm(data=dict(data, template_name=''), instance=template,
+                         created_by=UserFactory(), create_from_template=True)
+        self.assertEqual(form.initial['venue'], 'Bar')
+        self.assertTrue(form.is_valid())
+        instance = form.save()
+        self.assertEqual(template.template_name, 'Foo', msg=(
+            'The template should not be changed.'))
+        self.assertNotEqual(instance.pk, template.pk)
+        self.assertEqual(Event.objects.filter(template_name='Foo').count(), 1)
+        self.assertEqual(Event.objects.count(), 3)
+
+    def test_save_without_commit(self):
+        user = UserFactory()
+        data = {
+            'title': 'Foo',
+            'venue': 'Bar',
+            'start': timezone.now(),
+            'end': timezone.now() + timezone.timedelta(days=11),
+            'template_name': 'Foo',
+        }
+        form = EventForm(data=data, created_by=user)
+        self.assertTrue(form.is_valid())
+        instance = form.save(commit=False)
+        self.assertIsNone(instance.pk, msg=(
+            'The event should not be saved, if commit is False.'))
+        self.assertEqual(Event.objects.count(), 0, msg=(
+            'The template should not be saved before save_m2m is called.'))
+        instance.save()
+        form.save_m2m()
+        self.assertEqual(instance.slug, 'foo')
+        self.assertEqual(Event.objects.get(template_name='Foo').slug, 'foo-1')
+        self.assertEqual(Event.objects.count(), 2)
+
+
+class EventFormTransactionTestCase(TransactionTestCase):
+    """Tests for the transactions of the ``EventForm`` form class."""
+    longMessage = True
+
+    def test_save_in_outer_transaction(self):
+        class Rollback(Exception):
+            pass
+        form = EventForm(data={
+            'title': 'Foo',
+            'venue': 'Bar',
+            'start': timezone.now(),
+            'end': timezone.now() + timezone.timedelta(days=1),
+            'template_name': 'Foo',
+        }, created_by=UserFactory())
+        self.assertTrue(form.is_valid())
+        try:
+            with transaction.commit_on_success():
+                form.save()
+                raise Rollback
+        except Rollback:
+            pass
+        self.assertFalse(Event.objects.exists(), msg=(
+            'The events should be rolled back with the outer transaction.'))
+
 
 class GuestFormTestCase(TestCase):
     """Tests for the ``GuestForm`` form class."""
@@ -96,3 +178,22 @@ class GuestFormTestCase(TestCase):
         self.assertTrue(form.is_valid())
         form.save()
         self.assertEqual(Guest.objects.all().count(), 1)
+
+
+class WaitlistEntryFormTestCase(TestCase):
+    """Tests for the ``WaitlistEntryForm`` form class."""
+    longMessage = True
+
+    def test_validates_and_saves_input(self):
+        self.event = EventFactory(available_seats=3)
+        form = WaitlistEntryForm(data={'number_of_seats': 4},
+                                 event=self.event, user=None)
+        self.assertFalse(form.is_valid(), msg=(
+            'Entries with more seats than the event has would never be'
+            ' promoted.'))
+
+        form = WaitlistEntryForm(data={'number_of_seats': 3},
+                                 event=self.event, user=None)
+        self.assertTrue(form.is_valid(), msg=form.errors)
+        form.save()
+        self.assertEqual(WaitlistEntry.objects.get().number_of_seats, 3)
@@ -0,0 +1,39 @@
+"""Tests for the iCalendar feeds of the ``event_rsvp`` app."""
+from django.test import TestCase
+
+from event_rsvp.ical import escape_text, fold_line, get_token_user
+from event_rsvp.ical import get_user_token
+from event_rsvp.tests.factories import UserFactory
+
+
+class ICalTestCase(TestCase):
+    """Tests for the helper functions of the ``ical`` module."""
+    longMessage = True
+
+    def test_escape_text(self):
+        self.assertEqual(escape_text('a,b;c\\d\ne'), 'a\\,b\\;c\\\\d\\ne')
+        self.assertEqual(escape_text(None), '')
+
+    def test_fold_line(self):
+        self.assertEqual(fold_line(u'SUMMARY:Foo'), 'SUMMARY:Foo\r\n')
+        lines = fold_line(u'SUMMARY:' + u'\xe4' * 100).split('\r\n')
+        self.assertEqual(len(lines), 4)
+        for line in lines:
+            self.assertTrue(len(line) <= 75, msg=(
+                'Lines should be folded after 75 octets.'))
+            line.decode('utf-8')
+
+    def test_user_token(self):
+        user = UserFactory()
+        token = get_user_token(user)
+        self.assertEqual(get_token_user(token), user)
+        self.assertEqual(get_token_user(token + 'x'), None)
+        self.assertEqual(get_token_user('foo'), None)
+        self.assertEqual(get_token_user('0-foo'), None)
+        user.set_password('new')
+        user.save()
+        self.assertEqual(get_token_user(token), None, msg=(
+            'Changing the password should revoke the token.'))
+        user.is_active = False
+        user.save()
+        self.assertEqual(get_token_user(get_user_token(user)), None)
@@ -0,0 +1,75 @@
+"""Tests for the database indexes of the ``event_rsvp`` app."""
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.unittest import skipUnless
+
+from event_rsvp.indexes import create_indexes, drop_indexes
+from event_rsvp.models import Event, Guest, WaitlistEntry
+
+
+@skipUnless(connection.vendor in ('postgresql', 'sqlite'),
+            'EXPLAIN output is only parsed for PostgreSQL and SQLite.')
+class IndexUsageTestCase(TestCase):
+    """Makes sure, that the hot queries of the app are using the indexes."""
+    longMessage = True
+
+    def setUp(self):
+        # The test database is created by syncdb instead of South
+        create_indexes(connection)
+
+    def tearDown(self):
+        drop_indexes(connection)
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.get_compiler(
+            using=queryset.db).as_sql()
+        cursor = connection.cursor()
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        else:
+            # Tables are tiny during tests, so sequential scans would win
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+        return ' '.join([' '.join([unicode(col) for col in row])
+                         for row in cursor.fetchall()])
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.get_plan(queryset)
+        self.assertIn(index, plan, msg=(
+            'The query should use the {0} index. Plan: {1}'.format(
+                index, plan)))
+
+    def test_listing(self):
+        self.assertUsesIndex(
+            Event.objects.filter(
+                start__gt=timezone.now(), is_published=True),
+            'event_rsvp_event_is_published_start')
+
+    def test_dashboard(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Event.objects.filter(start__lte=now, end__gte=now),
+            'event_rsvp_event_start_end')
+
+    def test_templates(self):
+        self.assertUsesIndex(
+            Event.objects.filter(template_name__gt=''),
+            'event_rsvp_event_template_name')
+
+    def test_seats(self):
+        self.assertUsesIndex(
+            Guest.objects.filter(event=1, is_attending=True),
+            'event_rsvp_guest_event_id_is_attending')
+        self.assertUsesIndex(
+            Guest.objects.filter(event=1).values_list('is_attending')
+            .order_by(), 'event_rsvp_guest_event_id_is_attending')
+
+    def test_waitlist_head(self):
+        head = WaitlistEntry.objects.filter(event=1).select_related(
+            'event').order_by('creation_date', 'pk')[:1]
+        self.assertUsesIndex(
+            head, 'event_rsvp_waitlistentry_event_id_creation_date')
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', self.get_plan(head), msg=(
+                'The waitlist should not be sorted to find its head.'))
@@ -1,15 +1,29 @@
 """Tests for the views of the ``event_rsvp`` app."""
-from django.test import TestCase
+import json
+import threading
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.client import Client
 from django.utils import timezone
+from django.utils.unittest import skipIf
 
 from django_libs.tests.factories import UserFactory
 from django_libs.tests.mixins import ViewTestMixin
+from mock import patch
 
-from event_rsvp.models import Event, Guest
+from event_rsvp import broker, settings
+from event_rsvp.ical import format_datetime, get_user_token
+from event_rsvp.models import ArchivedEvent, Event, Guest, OutboxMessage
+from event_rsvp.signals import post_guest_create
 from event_rsvp.tests.factories import EventFactory, GuestFactory, StaffFactory
+from event_rsvp.tests.mixins import QueryBudgetTestMixin
+from event_rsvp.views import GuestDetailView
 
 
-class EventListViewTestCase(ViewTestMixin, TestCase):
+class EventListViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``EventListView`` view."""
     longMessage = True
 
@@ -21,8 +35,198 @@ class EventListViewTestCase(ViewTestMixin, TestCase):
         self.user = UserFactory()
         self.should_be_callable_when_authenticated(self.user)
 
+    def test_query_count(self):
+        for i in range(50):
+            event = EventFactory(
+                start=timezone.now() + timezone.timedelta(days=1),
+                is_published=True, available_seats=10)
+            GuestFactory(event=event)
+        with self.assertNumQueries(1, msg=(
+                'The seat stats should be annotated to the events.')):
+            resp = self.client.get(self.get_url())
+        self.assertQueryBudget(resp)
+
+    def test_my_participations(self):
+        self.user = UserFactory()
+        past_event = EventFactory(
+            start=timezone.now() - timezone.timedelta(days=1))
+        GuestFactory(event=past_event, user=self.user)
+        for i in range(30):
+            GuestFactory(user=self.user, event=EventFactory(
+                start=timezone.now() + timezone.timedelta(days=1)))
+        self.login(self.user)
+        resp = self.client.get(self.get_url())
+        self.assertEqual(len(resp.context['my_participations']), 20)
+        page = resp.context['my_participations_page']
+        self.assertTrue(page.has_next())
+
+        # The amount of queries doesn't depend on the amount of guests
+        with self.assertNumQueries(4):
+            resp = self.client.get(self.get_url(),
+                                   data={'my_after': page.next_cursor})
+        self.assertQueryBudget(resp)
+        self.assertEqual(len(resp.context['my_participations']), 10, msg=(
+            'Only participations in upcoming events should be listed.'))
+        self.assertFalse(resp.context['my_participations_page'].has_next())
+
+
+class EventListCalendarViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                    TestCase):
+    """Tests for the ``EventListCalendarView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.event = EventFactory(title='Meetup, Berlin', start=start,
+                                  is_published=True)
+        EventFactory(title='Draft', start=start)
+
+    def get_view_name(self):
+        return 'rsvp_event_list_ical'
+
+    def test_view(self):
+        resp = self.should_be_callable_when_anonymous()
+        self.assertEqual(resp['Content-Type'], 'text/calendar; charset=utf-8')
+        content = resp.content
+        self.assertQueryBudget(resp)
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn('SUMMARY:Meetup\\, Berlin\r\n', content)
+        self.assertIn('UID:event-{0}-{1}@testserver\r\n'.format(
+            self.event.pk, format_datetime(self.event.creation_date)), content)
+        self.assertIn('URL:http://testserver{0}\r\n'.format(
+            self.event.get_absolute_url()), content)
+
+        with self.assertNumQueries(1, msg=(
+                'Only the feed state should be queried for a 304.')):
+            resp = self.client.get(self.get_url(),
+                                   HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        self.event.title = 'Meetup'
+        self.event.save()
+        resp = self.client.get(self.get_url(), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200, msg=(
+            'The feed should be sent again after an event has changed.'))
 
-class EventDetailViewTestCase(ViewTestMixin, TestCase):
+
+class EventCalendarViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
+    """Tests for the ``EventCalendarView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory()
+
+    def get_url(self, **kwargs):
+        return self.event.get_ical_url()
+
+    def test_view(self):
+        self.is_not_callable()
+        self.event.is_published = True
+        self.event.save()
+        resp = self.should_be_callable_when_anonymous()
+        self.assertEqual(resp.content.count('BEGIN:VEVENT'), 1)
+        self.assertQueryBudget(resp)
+        self.assertTrue(resp['Last-Modified'])
+
+
+class MyEventsCalendarViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                   TestCase):
+    """Tests for the ``MyEventsCalendarView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        self.user = UserFactory()
+        start = timezone.now() + timezone.timedelta(days=1)
+        GuestFactory(user=self.user, event=EventFactory(
+            title='Attending', start=start, is_published=True))
+        GuestFactory(user=self.user, is_attending=False, event=EventFactory(
+            title='Declined', start=start, is_published=True))
+        GuestFactory(event=EventFactory(title='Other', start=start,
+                                        is_published=True))
+        GuestFactory(user=self.user, event=EventFactory(
+            title='Unpublished', start=start))
+
+    def get_view_name(self):
+        return 'rsvp_my_events_ical'
+
+    def get_view_kwargs(self):
+        return {'token': get_user_token(self.user)}
+
+    def test_view(self):
+        self.is_not_callable(kwargs={'token': 'foo'})
+        resp = self.should_be_callable_when_anonymous()
+        content = resp.content
+        self.assertQueryBudget(resp)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn('SUMMARY:Attending', content)
+
+
+class EventSeatsViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
+    """Tests for the ``EventSeatsView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.event = EventFactory(available_seats=10, is_published=True)
+        self.other_event = EventFactory(is_published=True)
+
+    def get_view_name(self):
+        return 'rsvp_event_seats'
+
+    def get_view_kwargs(self):
+        return {'event_slug': self.event.slug}
+
+    def test_view(self):
+        self.is_not_callable(kwargs={'event_slug': 'unknown'})
+        resp = self.should_be_callable_when_anonymous()
+        self.assertQueryBudget(resp)
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        self.assertIn('max-age=5', resp['Cache-Control'])
+        self.assertEqual(json.loads(resp.content)['free_seats'], 10)
+
+        resp = self.client.get(reverse('rsvp_event_seats_list'), data={
+            'slug': [self.event.slug, self.other_event.slug, 'unknown']})
+        self.assertQueryBudget(resp)
+        self.assertEqual(sorted(json.loads(resp.content).keys()),
+                         sorted([self.event.slug, self.other_event.slug]))
+
+
+class EventSeatsStreamViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                   TestCase):
+    """Tests for the ``EventSeatsStreamView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.event = EventFactory(available_seats=10, is_published=True)
+
+    def tearDown(self):
+        broker._broker = None
+
+    def get_view_name(self):
+        return 'rsvp_event_seats_stream'
+
+    def get_view_kwargs(self):
+        return {'event_slug': self.event.slug}
+
+    def test_view(self):
+        self.is_not_callable(message=(
+            'The stream should not be available without a broker.'))
+        with patch.object(settings, 'SSE_BROKER',
+                          'event_rsvp.broker.LocalBroker'), patch.object(
+                              settings, 'SSE_MAX_DURATION', 0):
+            self.is_not_callable(kwargs={'event_slug': 'unknown'})
+            resp = self.should_be_callable_when_anonymous()
+            self.assertEqual(resp['Content-Type'], 'text/event-stream')
+            self.assertIn('no-cache', resp['Cache-Control'])
+            content = resp.content
+            self.assertQueryBudget(resp)
+            self.assertIn('retry: 3000', content)
+            self.assertIn('"free_seats": 10', content)
+
+
+class EventDetailViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``EventDetailView`` view."""
     longMessage = True
 
@@ -41,8 +245,75 @@ class EventDetailViewTestCase(ViewTestMixin, TestCase):
         resp = self.client.get(self.event.get_absolute_url().replace('2', '1'))
         self.assertEqual(resp.status_code, 302)
 
+        # Moved events are redirected to their canonical URL
+        url = self.event.get_absolute_url()
+        self.event.start += timezone.timedelta(days=3)
+        self.event.end += timezone.timedelta(days=3)
+        self.event.save()
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(resp['Location'].endswith(
+            self.event.get_absolute_url()), msg=(
+                'Should redirect to the URL with the new start date.'))
+        self.should_be_callable_when_anonymous()
+
+        resp = self.client.get(url.replace(self.event.slug, 'unknown'))
+        self.assertEqual(resp.status_code, 404, msg=(
+            'Unknown slugs should raise a 404.'))
 
-class EventCreateViewTestCase(ViewTestMixin, TestCase):
+    def test_guest_list(self):
+        self.event = EventFactory()
+        staff = StaffFactory()
+        for i in range(25):
+            GuestFactory(event=self.event, user=UserFactory())
+        GuestFactory(event=self.event, is_attending=False)
+        resp = self.is_callable(user=staff)
+        self.assertEqual(len(resp.context['guests']), 20)
+        self.assertEqual(resp.context['attending_count'], 25)
+        self.assertEqual(resp.context['not_attending_count'], 1)
+
+        # The amount of queries doesn't depend on the amount of guests
+        with self.assertNumQueries(5):
+            resp = self.client.get(self.get_url(), data={
+                'guests_after': resp.context['guests'].next_cursor})
+        self.assertQueryBudget(resp)
+        self.assertEqual(len(resp.context['guests']), 6)
+
+    def test_archived(self):
+        past = timezone.now() - timezone.timedelta(days=10)
+        event = EventFactory(is_published=True, start=past,
+                             end=past + timezone.timedelta(hours=2))
+        GuestFactory(event=event)
+        url = event.get_absolute_url()
+        ArchivedEvent.objects.archive(timezone.now())
+        self.event = ArchivedEvent.objects.get(original_id=event.pk)
+        self.assertEqual(self.get_url(), url)
+        resp = self.should_be_callable_when_anonymous()
+        self.assertEqual(resp.template_name[0],
+                         'event_rsvp/archivedevent_detail.html')
+
+        resp = self.is_callable(user=StaffFactory())
+        self.assertQueryBudget(resp)
+        self.assertEqual(resp.context['attending_count'], 1)
+
+        # A new event may take the slug of an archived one
+        new_event = EventFactory(is_published=True)
+        self.assertEqual(new_event.slug, self.event.slug)
+        self.assertEqual(self.client.get(url).context['object'], self.event)
+        other_day = past + timezone.timedelta(days=1)
+        resp = self.client.get(reverse('rsvp_event_detail', kwargs={
+            'slug': new_event.slug,
+            'year': '{0:04d}'.format(other_day.year),
+            'month': '{0:02d}'.format(other_day.month),
+            'day': '{0:02d}'.format(other_day.day),
+        }))
+        self.assertEqual(resp.status_code, 302, msg=(
+            'The live event should be preferred for a wrong date.'))
+        self.assertTrue(resp['Location'].endswith(
+            new_event.get_absolute_url()))
+
+
+class EventCreateViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``EventCreateView`` view."""
     longMessage = True
 
@@ -65,10 +336,11 @@ class EventCreateViewTestCase(ViewTestMixin, TestCase):
             'end': timezone.now() + timezone.timedelta(days=11),
             'max_seats_per_guest': 1,
         }
-        self.is_callable('POST', data=data)
+        resp = self.is_callable('POST', data=data)
+        self.assertQueryBudget(resp)
 
 
-class EventUpdateViewTestCase(ViewTestMixin, TestCase):
+class EventUpdateViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``EventUpdateView`` view."""
     longMessage = True
 
@@ -87,12 +359,13 @@ class EventUpdateViewTestCase(ViewTestMixin, TestCase):
             'end': self.event.end,
             'max_seats_per_guest': 20,
         }
-        self.is_callable('POST', data=data, user=self.staff)
+        resp = self.is_callable('POST', data=data, user=self.staff)
+        self.assertQueryBudget(resp)
         self.assertEqual(
             Event.objects.get(pk=self.event.pk).max_seats_per_guest, 20)
 
 
-class EventDeleteViewTestCase(ViewTestMixin, TestCase):
+class EventDeleteViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``EventDeleteView`` view."""
     longMessage = True
 
@@ -104,11 +377,13 @@ class EventDeleteViewTestCase(ViewTestMixin, TestCase):
         self.staff = StaffFactory()
 
     def test_view(self):
-        self.is_callable('POST', data={'Foo': 'Bar'}, user=self.staff)
+        resp = self.is_callable('POST', data={'Foo': 'Bar'}, user=self.staff)
+        self.assertQueryBudget(resp)
         self.assertEqual(Event.objects.all().count(), 0)
 
 
-class EventCreateFromTemplateViewTestCase(ViewTestMixin, TestCase):
+class EventCreateFromTemplateViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                          TestCase):
     """Tests for the ``EventCreateFromTemplateView`` view."""
     longMessage = True
 
@@ -132,13 +407,15 @@ class EventCreateFromTemplateViewTestCase(ViewTestMixin, TestCase):
             'start': self.event.start,
             'end': self.event.end,
         }
-        self.is_callable('POST', data=data, user=self.staff)
+        resp = self.is_callable('POST', data=data, user=self.staff)
+        self.assertQueryBudget(resp)
 
         # The template remains and a new event has been created
         self.assertEqual(Event.objects.all().count(), 2)
 
 
-class StaffDashboardViewTestCase(ViewTestMixin, TestCase):
+class StaffDashboardViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                 TestCase):
     """Tests for the ``StaffDashboardView`` view."""
     longMessage = True
 
@@ -149,8 +426,32 @@ class StaffDashboardViewTestCase(ViewTestMixin, TestCase):
         staff = StaffFactory()
         self.is_callable(user=staff)
 
-
-class GuestCreateViewTestCase(ViewTestMixin, TestCase):
+    def test_buckets(self):
+        staff = StaffFactory()
+        now = timezone.now()
+        for i in range(25):
+            EventFactory(start=now - timezone.timedelta(days=3),
+                         end=now - timezone.timedelta(days=2))
+        upcoming = EventFactory(start=now + timezone.timedelta(days=1),
+                                end=now + timezone.timedelta(days=2))
+        GuestFactory(event=upcoming)
+        GuestFactory(event=upcoming)
+        GuestFactory(event=upcoming, is_attending=False)
+        EventFactory(start=now - timezone.timedelta(days=1),
+                     end=now + timezone.timedelta(days=1))
+        EventFactory(template_name='Foo')
+        resp = self.is_callable(user=staff)
+        self.assertQueryBudget(resp)
+        self.assertEqual(resp.context['upcoming'][0].attending_count, 2)
+        self.assertEqual(len(resp.context['current']), 1)
+        self.assertEqual(len(resp.context['templates']), 1)
+        self.assertEqual(len(resp.context['past']), 20)
+        resp = self.is_callable(user=staff, data={
+            'past_after': resp.context['past_page'].next_cursor})
+        self.assertEqual(len(resp.context['past']), 5)
+
+
+class GuestCreateViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``GuestCreateView`` view."""
     longMessage = True
 
@@ -169,11 +470,84 @@ class GuestCreateViewTestCase(ViewTestMixin, TestCase):
         self.is_not_callable(kwargs={'event_slug': 'bullshit'})
 
         self.should_be_callable_when_anonymous()
+        resp = self.is_callable('POST', data={}, user=self.user)
+        self.assertQueryBudget(resp)
+        self.assertEqual(Guest.objects.all().count(), 1)
+
+    def test_outbox(self):
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs['event'])
+        post_guest_create.connect(receiver)
+        with patch.object(settings, 'USE_OUTBOX', True):
+            self.is_callable('POST', data={}, user=self.user)
+        self.assertEqual(received, [], msg=(
+            'The signal should be sent by the rsvp_process_outbox command.'))
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.guest, Guest.objects.get())
+        self.assertEqual(message.user, self.user)
+
         self.is_callable('POST', data={}, user=self.user)
+        post_guest_create.disconnect(receiver)
+        self.assertEqual(received, [self.event])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_seats_taken_after_validation(self):
+        self.event.available_seats = 2
+        self.event.save()
+        GuestFactory(event=self.event, number_of_seats=1)
+        # Simulate that the last seat is taken between validation and save
+        with patch.object(Event, 'get_free_seats', return_value=2):
+            resp = self.is_callable('POST', data={'number_of_seats': 2},
+                                    user=self.user)
+        self.assertTrue(resp.context['form'].errors, msg=(
+            'The form should be displayed again with an error message.'))
         self.assertEqual(Guest.objects.all().count(), 1)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).reserved_seats,
+                         1)
 
 
-class GuestDeleteViewTestCase(ViewTestMixin, TestCase):
+@skipIf(connection.vendor == 'sqlite'
+        and connection.settings_dict['NAME'] == ':memory:',
+        'Threads cannot share an in-memory database.')
+class GuestCreateViewConcurrencyTestCase(TransactionTestCase):
+    """Stress test for parallel requests to the ``GuestCreateView`` view."""
+    longMessage = True
+    requests = 200
+
+    def setUp(self):
+        self.event = EventFactory(
+            start=timezone.now() + timezone.timedelta(days=1),
+            available_seats=50, allow_anonymous_rsvp=True)
+
+    def test_no_overbooking(self):
+        url = reverse('rsvp_guest_create',
+                      kwargs={'event_slug': self.event.slug})
+        start = threading.Event()
+
+        def post():
+            start.wait()
+            try:
+                Client().post(url, data={'number_of_seats': 1})
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post)
+                   for i in range(self.requests)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(event.reserved_seats, 50, msg=(
+            'All seats should be booked, but never more than available.'))
+        self.assertEqual(Guest.objects.filter(event=event).count(), 50)
+
+
+class GuestDeleteViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``GuestDeleteView`` view."""
     longMessage = True
 
@@ -188,11 +562,67 @@ class GuestDeleteViewTestCase(ViewTestMixin, TestCase):
         return {'pk': self.guest.pk, 'event_slug': self.guest.event.slug}
 
     def test_view(self):
-        self.is_callable('POST', data={'Foo': 'Bar'}, user=self.staff)
+        resp = self.is_callable('POST', data={'Foo': 'Bar'}, user=self.staff)
+        self.assertQueryBudget(resp)
         self.assertEqual(Guest.objects.all().count(), 0)
 
 
-class GuestDetailViewTestCase(ViewTestMixin, TestCase):
+class GuestExportViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
+    """Tests for the ``GuestExportView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory(title='Meetup')
+        self.guest = GuestFactory(event=self.event, name='Foo',
+                                  email='foo@example.com')
+        self.other_guest = GuestFactory(name='Bar')
+        self.staff = StaffFactory()
+
+    def get_view_name(self):
+        return 'rsvp_guest_export'
+
+    def get_view_kwargs(self):
+        return {'event_slug': self.event.slug}
+
+    def test_view(self):
+        self.is_not_callable(user=UserFactory())
+        self.is_not_callable(user=self.staff,
+                             kwargs={'event_slug': 'foobar'})
+        self.is_callable(user=self.staff)
+        # Session, user, event and the guests
+        with self.assertNumQueries(4, msg=(
+                'The guests should be exported with one query.')):
+            resp = self.client.get(self.get_url())
+            lines = resp.content.splitlines()
+        self.assertQueryBudget(resp)
+        self.assertEqual(resp['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('Meetup,'))
+        self.assertIn(',Foo,foo@example.com,', lines[1])
+
+    def test_all_events(self):
+        url = reverse('rsvp_guest_export_all')
+        self.login(self.staff)
+        resp = self.client.get(url)
+        self.assertEqual(len(resp.content.splitlines()), 3)
+        resp = self.client.get(url, data={
+            'event': [self.other_guest.event.pk, 'foo']})
+        lines = resp.content.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',Bar,', lines[1])
+
+    def test_formula_injection(self):
+        self.guest.name = '=HYPERLINK("http://example.com")'
+        self.guest.phone = '+49 123'
+        self.guest.save()
+        self.login(self.staff)
+        lines = self.client.get(self.get_url()).content.splitlines()
+        self.assertIn(''',"'=HYPERLINK(""http://example.com"")",''', lines[1],
+                      msg=('Formulas should be escaped with a quote.'))
+        self.assertIn(",'+49 123,", lines[1])
+
+
+class GuestDetailViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``GuestDetailView`` view."""
     longMessage = True
 
@@ -208,12 +638,21 @@ class GuestDetailViewTestCase(ViewTestMixin, TestCase):
         return {'pk': self.guest.pk, 'event_slug': self.guest.event.slug}
 
     def test_view(self):
-        self.should_be_callable_when_authenticated(self.staff)
+        resp = self.should_be_callable_when_authenticated(self.staff)
+        self.assertQueryBudget(resp)
         self.is_not_callable(kwargs={'pk': self.guest.pk,
                                      'event_slug': self.event.slug})
 
+    def test_get_object(self):
+        view = GuestDetailView()
+        view.kwargs = self.get_view_kwargs()
+        with self.assertNumQueries(1):
+            self.assertEqual(view.get_object(), self.guest)
+            self.assertEqual(view.get_event(), self.guest.event, msg=(
+                'The event should be fetched together with the guest.'))
 
-class GuestUpdateViewTestCase(ViewTestMixin, TestCase):
+
+class GuestUpdateViewTestCase(QueryBudgetTestMixin, ViewTestMixin, TestCase):
     """Tests for the ``GuestUpdateView`` view."""
     longMessage = True
 
@@ -230,8 +669,41 @@ class GuestUpdateViewTestCase(ViewTestMixin, TestCase):
 
     def test_view(self):
         self.should_be_callable_when_authenticated(self.staff)
-        self.should_be_callable_when_authenticated(self.user)
+        resp = self.should_be_callable_when_authenticated(self.user)
+        self.assertQueryBudget(resp)
         self.is_not_callable(kwargs={'pk': self.guest.pk, 'event_slug': '500'})
         self.guest.user = None
         self.guest.save()
         self.is_not_callable(user=self.user)
+
+
+class WaitlistEntryCreateViewTestCase(QueryBudgetTestMixin, ViewTestMixin,
+                                      TestCase):
+    """Tests for the ``WaitlistEntryCreateView`` view."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory(available_seats=1)
+        self.user = UserFactory()
+
+    def get_view_name(self):
+        return 'rsvp_waitlist_create'
+
+    def get_view_kwargs(self):
+        return {'event_slug': self.event.slug}
+
+    def test_view(self):
+        self.is_not_callable(kwargs={'event_slug': 'bullshit'})
+        self.is_callable(user=self.user, and_redirects_to=reverse(
+            'rsvp_guest_create', kwargs={'event_slug': self.event.slug}))
+
+        guest = GuestFactory(event=self.event)
+        self.is_callable(user=self.user)
+        resp = self.is_callable('POST', data={'number_of_seats': 1})
+        self.assertQueryBudget(resp)
+        self.assertEqual(self.event.waitlist.count(), 1)
+
+        guest.delete()
+        self.assertEqual(self.event.waitlist.count(), 0)
+        self.assertEqual(self.event.guests.get().user, self.user, msg=(
+            'The waiting user should have been promoted.'))
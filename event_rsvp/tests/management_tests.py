@@ -0,0 +1,198 @@
+"""Tests for the management commands of the ``event_rsvp`` app."""
+import json
+import tempfile
+from StringIO import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from mock import patch
+
+from event_rsvp.models import (
+    ArchivedEvent,
+    Event,
+    Guest,
+    OutboxMessage,
+    get_bulk_batch_size,
+)
+from event_rsvp.signals import post_guest_create
+from event_rsvp.tests.factories import (
+    EventFactory,
+    GuestFactory,
+    RecurrenceRuleFactory,
+)
+
+
+class RebuildSeatCountersTestCase(TestCase):
+    """Tests for the ``rsvp_rebuild_seat_counters`` command."""
+    longMessage = True
+
+    def test_command(self):
+        event = EventFactory(available_seats=20)
+        GuestFactory(event=event, number_of_seats=2)
+        GuestFactory(event=event, number_of_seats=3)
+        GuestFactory(event=event, number_of_seats=4, is_attending=False)
+        Event.objects.update(reserved_seats=15)
+        call_command('rsvp_rebuild_seat_counters', verbosity=0)
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 5,
+                         msg='Only attending guests should be counted.')
+
+
+class MaterializeRecurrencesTestCase(TestCase):
+    """Tests for the ``rsvp_materialize_recurrences`` command."""
+    longMessage = True
+
+    def test_command(self):
+        start = (timezone.now() + timezone.timedelta(days=1)).replace(
+            microsecond=0)
+        rule = RecurrenceRuleFactory(template=EventFactory(
+            template_name='Foo', start=start))
+        RecurrenceRuleFactory(is_active=False)
+        call_command('rsvp_materialize_recurrences', days=20, verbosity=0)
+        self.assertEqual(Event.objects.filter(template_name='').count(), 3)
+        call_command('rsvp_materialize_recurrences', days=25, verbosity=0)
+        self.assertEqual(Event.objects.filter(template_name='').count(), 4,
+                         msg='Only the missing occurrences should be added.')
+        self.assertEqual(Event.objects.filter(
+            template_name='').latest('start').start,
+            start + timezone.timedelta(days=21))
+        self.assertTrue(rule.template.recurrence_rules.exists())
+
+
+class ArchiveEventsTestCase(TestCase):
+    """Tests for the ``rsvp_archive_events`` command."""
+    longMessage = True
+
+    def test_command(self):
+        for days in (3, 10):
+            past = timezone.now() - timezone.timedelta(days=days)
+            GuestFactory(event=EventFactory(
+                start=past, end=past + timezone.timedelta(hours=2)))
+        stdout = StringIO()
+        call_command('rsvp_archive_events', days=5, stdout=stdout)
+        self.assertEqual(stdout.getvalue(),
+                         'Archived 1 event(s) with 1 guest(s).\n')
+        self.assertEqual(Event.objects.count(), 1)
+        call_command('rsvp_archive_events', days=0, batch_size=1,
+                     verbosity=0)
+        self.assertEqual(ArchivedEvent.objects.count(), 2, msg=(
+            'Events, that ended before the given days, should be archived.'))
+
+
+class ImportGuestsTestCase(TestCase):
+    """Tests for the ``rsvp_import_guests`` command."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory(available_seats=5, max_seats_per_guest=3,
+                                  required_fields=['email'])
+        GuestFactory(event=self.event, number_of_seats=1,
+                     email='foo@example.com')
+        self.other_event = EventFactory()
+
+    def import_guests(self, content, suffix, **options):
+        import_file = tempfile.NamedTemporaryFile(suffix=suffix)
+        import_file.write(content)
+        import_file.flush()
+        stdout = StringIO()
+        call_command('rsvp_import_guests', import_file.name, stdout=stdout,
+                     **options)
+        import_file.close()
+        return stdout.getvalue()
+
+    def test_csv(self):
+        output = self.import_guests('\n'.join([
+            'name,email,number_of_seats,is_attending',
+            'A,a@example.com,2,',
+            'B,b@example.com,4,',
+            'C,,1,',
+            'D,d@example.com,2,',
+            'E,e@example.com,3,no',
+            'F,invalid,1,',
+        ]), '.csv', event=self.event.slug, chunk_size=2)
+        self.assertIn('Imported 3 guest(s), rejected 3 row(s).', output)
+        self.assertIn('Rejected line 3: Only 3 seat(s) per guest', output)
+        self.assertIn('Rejected line 4: The field "email" is required.',
+                      output)
+        self.assertIn('Rejected line 7: email:', output)
+        self.assertEqual(self.event.guests.count(), 4)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).reserved_seats,
+                         5, msg='Only attending guests should reserve seats.')
+
+        output = self.import_guests(
+            'name,email\nG,g@example.com\n', '.csv', event=self.event.slug)
+        self.assertIn('Rejected line 2: Only 0 seat(s) left.', output)
+
+    def test_default_chunk_size(self):
+        bulk_create = Guest.objects.bulk_create
+        with patch.object(Guest.objects, 'bulk_create',
+                          side_effect=bulk_create) as bulk_create_mock:
+            output = self.import_guests('\n'.join(
+                ['name'] + ['Guest {0}'.format(i) for i in range(200)]),
+                '.csv', event=self.other_event.slug)
+        self.assertIn('Imported 200 guest(s)', output)
+        chunk_size = get_bulk_batch_size(Guest, 1000)
+        self.assertEqual(
+            [len(args[0]) for args, kwargs in bulk_create_mock.call_args_list],
+            [chunk_size, chunk_size, 200 - 2 * chunk_size], msg=(
+                'The chunks should not exceed the parameter limit of SQLite.'))
+
+    def test_jsonl(self):
+        output = self.import_guests('\n'.join([
+            json.dumps({'event': self.other_event.slug, 'name': 'A',
+                        'number_of_seats': 10}),
+            json.dumps({'event': 'unknown', 'name': 'B'}),
+            '',
+            '[1, 2]',
+            json.dumps({'name': 'C'}),
+        ]), '.jsonl')
+        self.assertIn('Imported 1 guest(s), rejected 3 row(s).', output)
+        self.assertIn('Rejected line 2: The event "unknown" does not exist.',
+                      output)
+        self.assertIn('Rejected line 4: Invalid JSON object.', output)
+        self.assertIn('Rejected line 5: No event given.', output)
+        self.assertEqual(
+            Event.objects.get(pk=self.other_event.pk).reserved_seats, 10)
+
+
+class ProcessOutboxTestCase(TestCase):
+    """Tests for the ``rsvp_process_outbox`` command."""
+    longMessage = True
+
+    def setUp(self):
+        self.guests = []
+        for i in range(3):
+            guest = GuestFactory(email='guest{0}@example.com'.format(i))
+            OutboxMessage.objects.create(guest=guest, event=guest.event)
+            self.guests.append(guest)
+        self.connections = set()
+        post_guest_create.connect(self.send_confirmation)
+
+    def tearDown(self):
+        post_guest_create.disconnect(self.send_confirmation)
+
+    def send_confirmation(self, sender, guest, connection, **kwargs):
+        if guest.email == 'guest1@example.com':
+            raise ValueError('SMTP is down.')
+        self.connections.add(connection)
+        mail.EmailMessage('Confirmation', 'Welcome', to=[guest.email],
+                          connection=connection).send()
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('rsvp_process_outbox', workers=1, batch_size=3,
+                     stdout=stdout)
+        self.assertIn('Delivered 2 message(s), 1 failed.', stdout.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(len(self.connections), 1, msg=(
+            'The batch should share one email connection.'))
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.guest, self.guests[1])
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, 'SMTP is down.')
+        self.assertTrue(message.next_attempt > timezone.now())
+
+        call_command('rsvp_process_outbox', workers=1, verbosity=0)
+        self.assertEqual(OutboxMessage.objects.get().attempts, 1, msg=(
+            'The message should not be retried before its next attempt.'))
@@ -0,0 +1,75 @@
+"""Tests for the middlewares of the ``event_rsvp`` app."""
+from django.core.urlresolvers import RegexURLResolver, resolve, reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from mock import patch
+
+from event_rsvp import settings, urls
+from event_rsvp.middleware import get_query_stats
+from event_rsvp.tests.factories import EventFactory
+
+
+class GetQueryStatsTestCase(TestCase):
+    """Tests for the ``get_query_stats`` function."""
+    longMessage = True
+
+    def test_function(self):
+        stats = get_query_stats([
+            {'sql': 'SELECT * FROM "foo" WHERE "id" = 1', 'time': '0.002'},
+            {'sql': 'SAVEPOINT "s1"', 'time': '0.001'},
+            {'sql': 'SELECT * FROM "foo" WHERE "id" = 2', 'time': '0.003'},
+            {'sql': "SELECT * FROM \"bar\" WHERE \"a\" = 'b'", 'time': '0'},
+        ])
+        self.assertEqual(stats['count'], 3, msg=(
+            'Savepoints should not be counted.'))
+        self.assertAlmostEqual(stats['time'], 0.005)
+        self.assertEqual(stats['duplicates'], [
+            (2, 'SELECT * FROM "foo" WHERE "id" = ?')], msg=(
+                'Statements, that only differ in their parameters, should be'
+                ' reported.'))
+
+
+class QueryBudgetMiddlewareTestCase(TestCase):
+    """Tests for the ``QueryBudgetMiddleware`` middleware."""
+    longMessage = True
+
+    def test_middleware(self):
+        EventFactory()
+        url = reverse('rsvp_event_list')
+        with patch('event_rsvp.middleware.logger') as logger:
+            resp = self.client.get(url)
+            self.assertEqual(resp.query_stats['view'],
+                             'event_rsvp.views.EventListView')
+            self.assertEqual(resp.query_stats['budget'], 4)
+            self.assertEqual(resp.query_stats['count'], 1)
+            self.assertFalse(logger.warning.called)
+
+            with patch.object(resolve(url).func, 'query_budget', 0):
+                self.client.get(url)
+            self.assertTrue(logger.warning.called, msg=(
+                'Views, that exceed their budget, should be logged.'))
+
+            with patch.object(settings, 'QUERY_SAMPLE_RATE', 0):
+                resp = self.client.get(url)
+            self.assertFalse(hasattr(resp, 'query_stats'), msg=(
+                'Only the sampled requests should be recorded.'))
+
+    def test_streamed_response(self):
+        EventFactory(is_published=True,
+                     start=timezone.now() + timezone.timedelta(days=1))
+        resp = self.client.get(reverse('rsvp_event_list_ical'))
+        self.assertFalse(hasattr(resp, 'query_stats'), msg=(
+            'Streamed responses should be recorded, once they are consumed.'))
+        self.assertIn('BEGIN:VEVENT', resp.content)
+        self.assertEqual(resp.query_stats['count'], 2, msg=(
+            'The queries of the stream should be counted.'))
+
+    def test_budgets(self):
+        for pattern in urls.urlpatterns:
+            if isinstance(pattern, RegexURLResolver):
+                continue
+            self.assertIsNotNone(
+                getattr(pattern.callback, 'query_budget', None), msg=(
+                    'The view of "{0}" should declare a query budget.'.format(
+                        pattern.name)))
@@ -0,0 +1,25 @@
+"""Mixins for the tests of the ``event_rsvp`` app."""
+
+
+class QueryBudgetTestMixin(object):
+    """
+    Mixin for view tests, that enforces the ``query_budget`` of a view.
+
+    The queries are recorded by the ``QueryBudgetMiddleware``, so the tests
+    have to run with ``EVENT_RSVP_QUERY_SAMPLE_RATE = 1``. The content of
+    streamed responses has to be read before their budget is checked.
+
+    """
+    def assertQueryBudget(self, response, msg=None):
+        """Fails, if ``response`` needed more queries than its view may."""
+        stats = getattr(response, 'query_stats', None)
+        self.assertIsNotNone(stats, msg=(
+            'The queries of the response have not been recorded. Streamed'
+            ' responses are recorded, once their content has been read.'))
+        self.assertIsNotNone(stats['budget'], msg=(
+            '{0} declares no query budget.'.format(stats['view'])))
+        self.assertLessEqual(stats['count'], stats['budget'], msg=(
+            msg or '{0} ran {1} queries in {2:.3f}s, duplicates: {3}'.format(
+                stats['view'], stats['count'], stats['time'],
+                stats['duplicates'])))
+        return stats
@@ -1,9 +1,39 @@
 """Tests for models of the ``event_rsvp``` application."""
-from django.test import TestCase
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
 from django.utils import timezone
+from django.utils.unittest import skipUnless
 from django.utils.translation import ugettext_lazy as _
+from mock import patch
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
 
-from event_rsvp.tests.factories import EventFactory, GuestFactory
+from event_rsvp.models import (
+    ArchivedEvent,
+    ArchivedGuest,
+    Event,
+    Guest,
+    OutboxMessage,
+    RecurrenceRule,
+    SeatsUnavailable,
+    WaitlistEntry,
+    from_local,
+    get_bulk_batch_size,
+)
+from event_rsvp.signals import post_waitlist_promote
+from event_rsvp.tests.factories import (
+    EventFactory,
+    GuestFactory,
+    RecurrenceRuleFactory,
+    WaitlistEntryFactory,
+)
 
 
 class EventTestCase(TestCase):
@@ -12,6 +42,37 @@ class EventTestCase(TestCase):
         obj = EventFactory()
         self.assertTrue(obj.pk)
 
+    def test_save(self):
+        event_1 = EventFactory(title='Weekly Meetup')
+        self.assertEqual(event_1.slug, 'weekly-meetup')
+        event_2 = EventFactory(title='Weekly Meetup')
+        self.assertEqual(event_2.slug, 'weekly-meetup-1')
+        for i in range(10):
+            EventFactory(title='Weekly Meetup')
+        with self.assertNumQueries(2, msg=(
+                'The slug should be allocated with one query.')):
+            event_3 = EventFactory.build(title='Weekly Meetup',
+                                         created_by=event_1.created_by)
+            event_3.save()
+        self.assertEqual(event_3.slug, 'weekly-meetup-12')
+
+        # The slug stays untouched, if the title has not been changed, so
+        # there are only the SELECT and UPDATE queries of ``Model.save``
+        with self.assertNumQueries(2):
+            event_2.save()
+        self.assertEqual(event_2.slug, 'weekly-meetup-1')
+
+        event_2.title = 'Monthly Meetup'
+        event_2.save()
+        self.assertEqual(event_2.slug, 'monthly-meetup')
+
+        # Concurrent saves with the same slug are retried
+        event_4 = EventFactory.build(title='Weekly Meetup',
+                                     slug='weekly-meetup',
+                                     created_by=event_1.created_by)
+        event_4.save()
+        self.assertEqual(event_4.slug, 'weekly-meetup-13')
+
     def test_get_free_seats(self):
         event_1 = EventFactory(available_seats=20)
         self.assertEqual(event_1.get_free_seats(), 20)
@@ -20,6 +81,25 @@ class EventTestCase(TestCase):
                          _('Unlimited seats available.'))
         GuestFactory(event=event_1)
         self.assertEqual(event_1.get_free_seats(), 19)
+        self.assertEqual(
+            Event.objects.get(pk=event_1.pk).get_free_seats(), 19)
+        event_1.update_reserved_seats(4)
+        self.assertEqual(event_1.get_free_seats(), 15, msg=(
+            'The free seats should follow the counter of the instance.'))
+
+    def test_required_fields(self):
+        event_1 = EventFactory(required_fields=['name', 'phone'])
+        EventFactory(required_fields=['email'])
+        EventFactory()
+        self.assertEqual(Event.objects.get(pk=event_1.pk).required_fields,
+                         ['name', 'phone'])
+        self.assertEqual(
+            list(Event.objects.requiring('phone').values_list(
+                'pk', flat=True)), [event_1.pk])
+        self.assertEqual(Event.objects.requiring('name').count(), 1)
+        self.assertEqual(Event.objects.requiring('email').count(), 1)
+        event_1.required_fields = ['foo']
+        self.assertRaises(ValidationError, event_1.full_clean)
 
     def test_is_bookable(self):
         event_1 = EventFactory()
@@ -36,3 +116,356 @@ class GuestTestCase(TestCase):
     def test_model(self):
         obj = GuestFactory()
         self.assertTrue(obj.pk)
+
+    def test_reserved_seats(self):
+        event = EventFactory(available_seats=20)
+        guest = GuestFactory(event=event, number_of_seats=3)
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 3)
+
+        guest.number_of_seats = 5
+        guest.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 5)
+
+        guest.is_attending = False
+        guest.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 0)
+
+        guest.is_attending = True
+        guest.save()
+        other_event = EventFactory()
+        guest.event = other_event
+        guest.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 0)
+        self.assertEqual(
+            Event.objects.get(pk=other_event.pk).reserved_seats, 5)
+
+        guest.delete()
+        self.assertEqual(
+            Event.objects.get(pk=other_event.pk).reserved_seats, 0)
+
+    def test_seats_unavailable(self):
+        event = EventFactory(available_seats=3)
+        guest = GuestFactory(event=event, number_of_seats=2)
+        self.assertRaises(SeatsUnavailable, GuestFactory, event=event,
+                          number_of_seats=2)
+        guest.number_of_seats = 4
+        self.assertRaises(SeatsUnavailable, guest.save)
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 2)
+
+        # TestCase runs in a managed transaction, so nothing is rolled back
+        guest.number_of_seats = 2
+        guest.event = EventFactory(available_seats=1)
+        self.assertRaises(SeatsUnavailable, guest.save)
+        self.assertEqual(Event.objects.get(pk=event.pk).reserved_seats, 2,
+                         msg=('The seats of the old event should be kept, if'
+                              ' the new event is fully booked.'))
+
+
+class WaitlistEntryTestCase(TestCase):
+    """Tests for the ``WaitlistEntry`` model class."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory(available_seats=4)
+        self.guest = GuestFactory(event=self.event, number_of_seats=4)
+        self.first = WaitlistEntryFactory(event=self.event, name='First',
+                                          number_of_seats=2)
+        self.second = WaitlistEntryFactory(event=self.event, name='Second',
+                                           number_of_seats=3)
+        self.third = WaitlistEntryFactory(event=self.event, name='Third')
+
+    def test_model(self):
+        self.assertTrue(self.first.pk)
+        self.assertEqual(
+            WaitlistEntry.objects.get_head(self.event.pk), self.first)
+
+    def test_promote_on_less_seats(self):
+        promoted = []
+
+        def receiver(sender, guest, **kwargs):
+            promoted.append(guest.name)
+        post_waitlist_promote.connect(receiver)
+        self.guest.number_of_seats = 1
+        self.guest.save()
+        post_waitlist_promote.disconnect(receiver)
+        self.assertEqual(promoted, ['First'], msg=(
+            'The second entry needs more seats than are left and the third'
+            ' must not overtake it.'))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).reserved_seats,
+                         3)
+        self.assertEqual(
+            WaitlistEntry.objects.get_head(self.event.pk), self.second)
+
+    def test_promote_on_not_attending(self):
+        self.guest.is_attending = False
+        self.guest.save()
+        self.assertEqual(
+            list(self.event.guests.filter(is_attending=True).values_list(
+                'name', flat=True).order_by('pk')), ['First'])
+        self.guest.event = EventFactory()
+        self.guest.save()
+        self.assertEqual(self.event.waitlist.count(), 2)
+
+    def test_promote_on_move_and_delete(self):
+        self.guest.event = EventFactory()
+        self.guest.save()
+        self.assertEqual(self.event.waitlist.count(), 2)
+        Event.objects.filter(pk=self.event.pk).update(available_seats=10)
+        GuestFactory(event=self.event).delete()
+        self.assertEqual(self.event.waitlist.count(), 0)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).reserved_seats,
+                         6)
+
+    def test_delete_event(self):
+        GuestFactory(event=self.event, is_attending=False)
+        Event.objects.filter(pk=self.event.pk).update(available_seats=10)
+        promote = WaitlistEntry.objects.promote
+        with patch.object(WaitlistEntry.objects, 'promote',
+                          side_effect=promote) as promote_mock:
+            self.event.delete()
+        self.assertFalse(promote_mock.called, msg=(
+            'Nobody should be promoted into a deleted event.'))
+        self.assertFalse(Guest.objects.filter(event=self.event.pk).exists())
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+
+class WaitlistEntryTransactionTestCase(TransactionTestCase):
+    """Tests for the transactions of the ``WaitlistEntry`` promotion."""
+    longMessage = True
+
+    def setUp(self):
+        self.event = EventFactory(available_seats=2)
+        self.guest = GuestFactory(event=self.event, number_of_seats=2)
+        self.entry = WaitlistEntryFactory(event=self.event)
+
+    def test_promote_in_outer_transaction(self):
+        class Rollback(Exception):
+            pass
+        try:
+            with transaction.commit_on_success():
+                self.guest.delete()
+                self.assertFalse(WaitlistEntry.objects.exists())
+                raise Rollback
+        except Rollback:
+            pass
+        self.assertTrue(WaitlistEntry.objects.filter(
+            pk=self.entry.pk).exists(), msg=(
+                'The promotion should be rolled back with the transaction.'))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).reserved_seats,
+                         2)
+
+    def test_promote_seats_unavailable(self):
+        # Another request takes the seats after the head has been checked
+        with patch.object(Event, 'get_free_seats_count', return_value=2):
+            self.assertEqual(WaitlistEntry.objects.promote(self.event.pk), [])
+        self.assertTrue(WaitlistEntry.objects.filter(
+            pk=self.entry.pk).exists())
+
+
+class RecurrenceRuleTestCase(TestCase):
+    """Tests for the ``RecurrenceRule`` model."""
+    longMessage = True
+
+    def setUp(self):
+        # A monday
+        self.start = datetime.datetime(2030, 1, 7, 18, 0)
+        self.template = EventFactory(
+            title='Meetup', template_name='Meetup', start=self.start,
+            end=self.start + datetime.timedelta(hours=2), available_seats=10)
+
+    def test_model(self):
+        rule = RecurrenceRuleFactory(template=self.template)
+        self.assertTrue(rule.pk)
+        self.assertEqual(rule.first_start, self.start)
+
+    def test_clean(self):
+        rule = RecurrenceRuleFactory(template=EventFactory())
+        self.assertRaises(ValidationError, rule.clean)
+        rule = RecurrenceRuleFactory(template=self.template,
+                                     frequency='dates', dates='')
+        self.assertRaises(ValidationError, rule.clean)
+        rule.dates = '2030-01-10\nfoo'
+        self.assertRaises(ValidationError, rule.clean)
+        rule.dates = '2030-01-10'
+        rule.clean()
+
+    def test_get_starts(self):
+        day = datetime.timedelta(days=1)
+        rule = RecurrenceRule(template=self.template, first_start=self.start,
+                              frequency='monthly')
+        self.assertEqual(rule.get_starts(None, self.start + day * 60), [
+            self.start, datetime.datetime(2030, 2, 7, 18, 0),
+            datetime.datetime(2030, 3, 7, 18, 0)])
+        self.assertEqual(rule.get_starts(self.start, self.start + day * 40),
+                         [datetime.datetime(2030, 2, 7, 18, 0)], msg=(
+                             'Only the starts after "after" should be'
+                             ' returned.'))
+        rule.until = self.start + day * 40
+        self.assertEqual(len(rule.get_starts(None, self.start + day * 60)),
+                         2)
+
+        rule = RecurrenceRule(template=self.template, first_start=self.start,
+                              frequency='dates',
+                              dates='2030-01-20 10:00\n\n2030-01-10\n')
+        self.assertEqual(rule.get_starts(None, self.start + day * 60), [
+            datetime.datetime(2030, 1, 10, 18, 0),
+            datetime.datetime(2030, 1, 20, 10, 0)], msg=(
+                'Dates without a time should start at the time of the'
+                ' first start.'))
+
+    def test_materialize(self):
+        rule = RecurrenceRuleFactory(template=self.template, interval=2)
+        GuestFactory(event=self.template)
+        until = self.start + datetime.timedelta(days=35)
+        # Slugs, insert and the last start
+        with self.assertNumQueries(3):
+            events = rule.materialize(until)
+        self.assertEqual([event.start for event in events], [
+            self.start, datetime.datetime(2030, 1, 21, 18, 0),
+            datetime.datetime(2030, 2, 4, 18, 0)])
+        occurrences = Event.objects.filter(template_name='').order_by('start')
+        self.assertEqual(occurrences.count(), 3)
+        self.assertEqual(
+            len(set(occurrences.values_list('slug', flat=True))), 3)
+        occurrence = occurrences[0]
+        self.assertEqual(occurrence.title, 'Meetup')
+        self.assertEqual(occurrence.available_seats, 10)
+        self.assertEqual(occurrence.reserved_seats, 0, msg=(
+            'The counters should not be copied from the template.'))
+        self.assertEqual(occurrence.end - occurrence.start,
+                         datetime.timedelta(hours=2))
+
+        with self.assertNumQueries(0, msg=(
+                'Existing occurrences should not be created again.')):
+            self.assertEqual(rule.materialize(until), [])
+        rule = RecurrenceRule.objects.get(pk=rule.pk)
+        self.assertEqual(rule.last_start, datetime.datetime(
+            2030, 2, 4, 18, 0))
+        self.assertEqual(len(rule.materialize(
+            self.start + datetime.timedelta(days=50))), 1)
+
+    def test_materialize_dates(self):
+        rule = RecurrenceRuleFactory(template=self.template, frequency='dates',
+                                     dates='2030-01-20\n2030-01-10')
+        until = self.start + datetime.timedelta(days=35)
+        self.assertEqual(len(rule.materialize(until)), 2)
+        self.assertEqual(rule.occurrences.count(), 2)
+        self.assertEqual(rule.materialize(until), [], msg=(
+            'Existing occurrences should not be created again.'))
+
+        rule.dates += '\n2030-01-15'
+        events = rule.materialize(until)
+        self.assertEqual([event.start for event in events], [
+            datetime.datetime(2030, 1, 15, 18, 0)], msg=(
+                'Dates before the latest occurrence should be created, if'
+                ' they have been added later.'))
+        self.assertEqual(rule.last_start, datetime.datetime(
+            2030, 1, 20, 18, 0))
+        self.assertEqual(rule.occurrences.count(), 3)
+
+        # Cancel one occurrence and move another one
+        rule.occurrences.get(start=datetime.datetime(
+            2030, 1, 10, 18, 0)).delete()
+        rule.occurrences.filter(
+            start=datetime.datetime(2030, 1, 15, 18, 0)).update(
+                start=datetime.datetime(2030, 1, 16, 18, 0))
+        rule = RecurrenceRule.objects.get(pk=rule.pk)
+        self.assertEqual(rule.materialize(until), [], msg=(
+            'Cancelled or moved occurrences should not be created again.'))
+        self.assertEqual(rule.occurrences.count(), 2)
+
+
+@skipUnless(pytz, 'The time zones of the DST tests require pytz.')
+class FromLocalTestCase(TestCase):
+    """Tests for the ``from_local`` function."""
+    longMessage = True
+
+    def test_function(self):
+        with override_settings(USE_TZ=True), timezone.override(
+                pytz.timezone('Europe/Berlin')):
+            self.assertEqual(
+                from_local(datetime.datetime(2030, 3, 31, 2, 30)),
+                datetime.datetime(2030, 3, 31, 1, 30, tzinfo=timezone.utc),
+                msg='Times in the DST gap should be shifted.')
+            self.assertEqual(
+                from_local(datetime.datetime(2030, 10, 27, 2, 30)),
+                datetime.datetime(2030, 10, 27, 1, 30, tzinfo=timezone.utc),
+                msg='Ambiguous times should be taken as standard time.')
+
+
+class ArchivedEventTestCase(TestCase):
+    """Tests for the ``ArchivedEvent`` model class."""
+    longMessage = True
+
+    def test_archive(self):
+        past = timezone.now() - timezone.timedelta(days=10)
+        kwargs = {'start': past, 'end': past + timezone.timedelta(hours=2)}
+        events = [EventFactory(title='Foo', available_seats=10, **kwargs)
+                  for i in range(3)]
+        guests = [GuestFactory(event=event, number_of_seats=2)
+                  for event in events]
+        WaitlistEntryFactory(event=events[0])
+        template = EventFactory(template_name='Foo', **kwargs)
+        pending = EventFactory(**kwargs)
+        OutboxMessage.objects.create(guest=GuestFactory(event=pending),
+                                     event=pending)
+        OutboxMessage.objects.create(guest=guests[1], event=events[1],
+                                     attempts=5)
+        upcoming = EventFactory()
+
+        self.assertEqual(ArchivedEvent.objects.archive(
+            timezone.now(), batch_size=2, max_attempts=5), (3, 3))
+        self.assertEqual(sorted(Event.objects.values_list('pk', flat=True)),
+                         [template.pk, pending.pk, upcoming.pk], msg=(
+                             'Templates, events with undelivered messages and'
+                             ' upcoming events should not be archived.'))
+        self.assertEqual(Guest.objects.count(), 1)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(OutboxMessage.objects.count(), 1, msg=(
+            'Messages, that failed too often, should be deleted.'))
+
+        archived = ArchivedEvent.objects.get(original_id=events[0].pk)
+        self.assertEqual(archived.slug, events[0].slug)
+        self.assertEqual(archived.reserved_seats, 2)
+        self.assertEqual(archived.last_modified, events[0].last_modified,
+                         msg='The fields should be copied unchanged.')
+        self.assertEqual(
+            list(archived.guests.values_list('original_id', flat=True)),
+            [guests[0].pk], msg='The original ids should be kept.')
+        self.assertEqual(ArchivedGuest.objects.count(), 3)
+        self.assertEqual(ArchivedEvent.objects.archive(timezone.now()),
+                         (0, 0))
+
+    def test_archive_batches(self):
+        past = timezone.now() - timezone.timedelta(days=10)
+        for i in range(40):
+            EventFactory(start=past, end=past + timezone.timedelta(hours=2))
+        bulk_create = ArchivedEvent.objects.bulk_create
+        with patch.object(ArchivedEvent.objects, 'bulk_create',
+                          side_effect=bulk_create) as bulk_create_mock:
+            self.assertEqual(ArchivedEvent.objects.archive(timezone.now()),
+                             (40, 0))
+        batch_size = get_bulk_batch_size(ArchivedEvent, 100)
+        self.assertEqual(
+            [len(args[0]) for args, kwargs in bulk_create_mock.call_args_list],
+            [min(batch_size, 40 - i) for i in range(0, 40, batch_size)],
+            msg='The batches should not exceed the parameter limit of SQLite.')
+
+    def test_archive_reused_ids(self):
+        past = timezone.now() - timezone.timedelta(days=10)
+        kwargs = {'start': past, 'end': past + timezone.timedelta(hours=2)}
+        guest = GuestFactory(event=EventFactory(title='Foo', **kwargs))
+        ArchivedEvent.objects.archive(timezone.now())
+        # The database may reuse the ids of the deleted rows
+        event = EventFactory(id=guest.event_id, title='Bar', **kwargs)
+        GuestFactory(id=guest.pk, event=event)
+
+        self.assertEqual(ArchivedEvent.objects.archive(timezone.now()),
+                         (1, 1))
+        archived = ArchivedEvent.objects.filter(
+            original_id=event.pk).order_by('pk')
+        self.assertEqual([obj.title for obj in archived], ['Foo', 'Bar'])
+        self.assertEqual([obj.guests.get().original_id for obj in archived],
+                         [guest.pk, guest.pk], msg=(
+                             'The guests should belong to their own archived'
+                             ' event.'))
@@ -0,0 +1,80 @@
+"""Tests for the keyset pagination of the ``event_rsvp`` app."""
+from django.http import QueryDict
+from django.test import TestCase
+from django.utils import timezone
+
+from event_rsvp.models import Event
+from event_rsvp.pagination import KeysetPage, get_keyset_page
+from event_rsvp.tests.factories import EventFactory
+
+
+class GetKeysetPageTestCase(TestCase):
+    """Tests for the ``get_keyset_page`` function."""
+    longMessage = True
+
+    def setUp(self):
+        start = timezone.now()
+        # Two events per start date to test the pk tie-breaker
+        self.events = [
+            EventFactory(start=start + timezone.timedelta(days=i // 2))
+            for i in range(7)]
+
+    def test_function(self):
+        queryset = Event.objects.all()
+        page = get_keyset_page(queryset, 3, 'start')
+        self.assertEqual(page.object_list, self.events[:3])
+        self.assertFalse(page.has_previous())
+
+        page = get_keyset_page(queryset, 3, 'start', after=page.next_cursor)
+        self.assertEqual(page.object_list, self.events[3:6])
+        self.assertTrue(page.has_previous())
+
+        last_page = get_keyset_page(queryset, 3, 'start',
+                                    after=page.next_cursor)
+        self.assertEqual(last_page.object_list, self.events[6:])
+        self.assertFalse(last_page.has_next())
+
+        page = get_keyset_page(queryset, 3, 'start',
+                               before=last_page.previous_cursor)
+        self.assertEqual(page.object_list, self.events[3:6], msg=(
+            'Going back should return the same page as before.'))
+        page = get_keyset_page(queryset, 3, 'start',
+                               before=page.previous_cursor)
+        self.assertEqual(page.object_list, self.events[:3])
+        self.assertFalse(page.has_previous())
+
+        page = get_keyset_page(queryset, 4, 'start', descending=True)
+        self.assertEqual(page.object_list, self.events[::-1][:4])
+        page = get_keyset_page(queryset, 4, 'start', descending=True,
+                               after=page.next_cursor)
+        self.assertEqual(page.object_list, self.events[::-1][4:])
+
+        first_page = get_keyset_page(queryset, 3, 'start')
+        page = get_keyset_page(queryset, 3, 'start',
+                               after=first_page.next_cursor,
+                               before=last_page.previous_cursor)
+        self.assertEqual(page.object_list, self.events[3:6], msg=(
+            'If both cursors are given, ``after`` should win.'))
+
+        page = get_keyset_page(queryset, 3, 'start', after='invalid')
+        self.assertEqual(page.object_list, self.events[:3], msg=(
+            'An invalid cursor should return the first page.'))
+
+
+class KeysetPageTestCase(TestCase):
+    """Tests for the ``KeysetPage`` class."""
+    longMessage = True
+
+    def test_get_query(self):
+        page = KeysetPage([], prefix='past_', next_cursor='b',
+                          previous_cursor='a', query=QueryDict(
+                              'past_before=x&upcoming_after=y&foo=1'))
+        self.assertEqual(
+            QueryDict(page.get_next_query()),
+            QueryDict('past_after=b&upcoming_after=y&foo=1'), msg=(
+                'Only the cursor of this list should be replaced.'))
+        self.assertEqual(
+            QueryDict(page.get_previous_query()),
+            QueryDict('past_before=a&upcoming_after=y&foo=1'))
+        self.assertEqual(KeysetPage([], next_cursor='b').get_next_query(),
+                         'after=b')
@@ -27,7 +27,8 @@ class NoseCoverageTestRunner(CoverageRunner, NoseTestSuiteRunner):
 
 
 def runtests(*test_args):
-    failures = NoseCoverageTestRunner(verbosity=2, interactive=True).run_tests(
+    # The test database file is replaced without asking (see tox -e stress)
+    failures = NoseCoverageTestRunner(verbosity=2, interactive=False).run_tests(
         test_args)
     sys.exit(failures)
 
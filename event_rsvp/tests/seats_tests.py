@@ -0,0 +1,157 @@
+"""Tests for the seat availability of the ``event_rsvp`` app."""
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from mock import patch
+
+from event_rsvp import broker, settings
+from event_rsvp.seats import (
+    get_cache_key,
+    get_seat_stats,
+    iter_seat_stream,
+    publish_seat_stats,
+)
+from event_rsvp.tests.factories import EventFactory, GuestFactory
+
+
+class GetSeatStatsTestCase(TestCase):
+    """Tests for the ``get_seat_stats`` function."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.event = EventFactory(available_seats=10, start=start,
+                                  is_published=True)
+        GuestFactory(event=self.event, number_of_seats=3)
+        self.unlimited = EventFactory(start=start, is_published=True)
+        self.hidden = EventFactory(available_seats=1, start=start,
+                                   is_published=True,
+                                   hide_available_seats=True)
+        GuestFactory(event=self.hidden)
+        self.draft = EventFactory(available_seats=10, start=start)
+
+    def test_function(self):
+        slugs = [self.event.slug, self.unlimited.slug, self.hidden.slug,
+                 self.draft.slug, 'unknown']
+        with self.assertNumQueries(1, msg=(
+                'All events should be fetched with one query.')):
+            stats = get_seat_stats(slugs)
+        self.assertEqual(stats[self.event.slug], {
+            'is_bookable': True,
+            'is_fully_booked': False,
+            'available_seats': 10,
+            'reserved_seats': 3,
+            'free_seats': 7,
+        })
+        self.assertEqual(stats[self.unlimited.slug]['free_seats'], None)
+        self.assertFalse(stats[self.unlimited.slug]['is_fully_booked'])
+        self.assertEqual(stats[self.hidden.slug]['free_seats'], None)
+        self.assertTrue(stats[self.hidden.slug]['is_fully_booked'])
+        self.assertNotIn(self.draft.slug, stats)
+
+        GuestFactory(event=self.event)
+        with self.assertNumQueries(0, msg=(
+                'The stats should be cached.')):
+            self.assertEqual(get_seat_stats(slugs), stats)
+
+    def test_stale_stats(self):
+        stale = get_seat_stats([self.event.slug])
+        GuestFactory(event=self.event)
+        later = time.time() + settings.SEATS_CACHE_TIMEOUT + 1
+        with patch('time.time', return_value=later):
+            # Another request is refreshing the stats
+            cache.add('{0}_lock'.format(get_cache_key(self.event.slug)), True)
+            with self.assertNumQueries(0):
+                self.assertEqual(get_seat_stats([self.event.slug]), stale)
+            cache.delete('{0}_lock'.format(get_cache_key(self.event.slug)))
+            with self.assertNumQueries(1):
+                stats = get_seat_stats([self.event.slug])
+        self.assertEqual(stats[self.event.slug]['free_seats'], 6)
+
+
+    def test_cold_stats(self):
+        lock = '{0}_lock'.format(get_cache_key(self.event.slug))
+        cache.add(lock, True)
+        with patch('time.sleep') as sleep:
+            with self.assertNumQueries(1, msg=(
+                    'The stats should be read from the database, if the'
+                    ' request with the lock is too slow.')):
+                stats = get_seat_stats([self.event.slug])
+            self.assertEqual(stats[self.event.slug]['free_seats'], 7)
+            self.assertTrue(sleep.called, msg=(
+                'The stats should be awaited for a while.'))
+            self.assertIsNone(cache.get(get_cache_key(self.event.slug)),
+                              msg='Only the request with the lock should'
+                                  ' cache the stats.')
+
+            stats = {'free_seats': 7}
+
+            def fill_cache(delay):
+                cache.set(get_cache_key(self.event.slug),
+                          (time.time() + 5, stats))
+
+            sleep.side_effect = fill_cache
+            with self.assertNumQueries(0):
+                self.assertEqual(get_seat_stats([self.event.slug]),
+                                 {self.event.slug: stats})
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            get_seat_stats([self.event.slug])
+        self.assertIsNone(cache.get(lock), msg=(
+            'The lock should be released after the stats have been cached.'))
+
+
+class PublishSeatStatsTestCase(TestCase):
+    """Tests for the ``publish_seat_stats`` function."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.event = EventFactory(available_seats=10, is_published=True)
+
+    def tearDown(self):
+        broker._broker = None
+
+    def test_function(self):
+        with patch.object(settings, 'SSE_BROKER',
+                          'event_rsvp.broker.LocalBroker'):
+            with self.assertNumQueries(0, msg=(
+                    'Nothing should be read without subscribers.')):
+                publish_seat_stats(self.event.pk)
+            messages = broker.get_broker().listen(self.event.pk, 0.01)
+            self.assertIsNone(next(messages))
+            GuestFactory(event=self.event, number_of_seats=2)
+            self.assertEqual(next(messages)['free_seats'], 8, msg=(
+                'Saving a guest should publish the new stats.'))
+            self.assertEqual(
+                get_seat_stats([self.event.slug])[self.event.slug][
+                    'free_seats'], 8, msg=(
+                        'The cached stats should have been updated.'))
+            self.event.guests.all().delete()
+            self.assertEqual(next(messages)['free_seats'], 10, msg=(
+                'Deleting a guest should publish the new stats.'))
+
+
+class IterSeatStreamTestCase(TestCase):
+    """Tests for the ``iter_seat_stream`` function."""
+    longMessage = True
+
+    def test_function(self):
+        local = broker.LocalBroker()
+        with patch.object(settings, 'SSE_KEEPALIVE', 0.01):
+            stream = iter_seat_stream(local, 1, {'free_seats': 1})
+            self.assertEqual(next(stream), 'retry: 3000\n')
+            self.assertEqual(next(stream),
+                             'event: seats\ndata: {"free_seats": 1}\n\n')
+            self.assertEqual(next(stream), ': keepalive\n\n')
+            local.publish(1, {'free_seats': 0})
+            self.assertEqual(next(stream),
+                             'event: seats\ndata: {"free_seats": 0}\n\n')
+        with patch.object(settings, 'SSE_MAX_DURATION', 0):
+            self.assertEqual(len(list(iter_seat_stream(local, 1, {}))), 2,
+                             msg='The stream should be closed in time.')
@@ -37,6 +37,16 @@ DATABASES = {
     }
 }
 
+# Threads cannot share an in-memory database. Tests, which need several
+# connections (e.g. the concurrency stress test), only run, if
+# EVENT_RSVP_TEST_DATABASE points to a database file (see tox -e stress).
+if os.environ.get('EVENT_RSVP_TEST_DATABASE'):
+    DATABASES['default'].update({
+        'NAME': os.environ['EVENT_RSVP_TEST_DATABASE'],
+        'TEST_NAME': os.environ['EVENT_RSVP_TEST_DATABASE'],
+        'OPTIONS': {'timeout': 60},
+    })
+
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.MD5PasswordHasher',
 )
@@ -95,8 +105,12 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'event_rsvp.middleware.QueryBudgetMiddleware',
 )
 
+# Record the queries of every request for ``QueryBudgetTestMixin``
+EVENT_RSVP_QUERY_SAMPLE_RATE = 1
+
 # django-cms settings
 gettext = lambda s: s
 
@@ -6,13 +6,20 @@ from event_rsvp.views import (
     EventCreateFromTemplateView,
     EventDeleteView,
     EventDetailView,
+    EventCalendarView,
+    EventListCalendarView,
     EventListView,
+    EventSeatsStreamView,
+    EventSeatsView,
     EventUpdateView,
     GuestCreateView,
     GuestDeleteView,
     GuestDetailView,
+    GuestExportView,
     GuestUpdateView,
+    MyEventsCalendarView,
     StaffDashboardView,
+    WaitlistEntryCreateView,
 )
 
 
@@ -22,6 +29,18 @@ urlpatterns = patterns(
         EventListView.as_view(),
         name='rsvp_event_list'),
 
+    url(r'^ical/$',
+        EventListCalendarView.as_view(),
+        name='rsvp_event_list_ical'),
+
+    url(r'^ical/my/(?P<token>[-:\w]+)/$',
+        MyEventsCalendarView.as_view(),
+        name='rsvp_my_events_ical'),
+
+    url(r'^seats/$',
+        EventSeatsView.as_view(),
+        name='rsvp_event_seats_list'),
+
     url(r'^create/$',
         EventCreateView.as_view(),
         name='rsvp_event_create'),
@@ -34,6 +53,10 @@ urlpatterns = patterns(
         StaffDashboardView.as_view(),
         name='rsvp_event_staff'),
 
+    url(r'^event-staff/export/$',
+        GuestExportView.as_view(),
+        name='rsvp_guest_export_all'),
+
     url(r'^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?P<slug>[-\w]+)/'
         'delete/$',
         EventDeleteView.as_view(),
@@ -44,6 +67,11 @@ urlpatterns = patterns(
         EventUpdateView.as_view(),
         name='rsvp_event_update'),
 
+    url(r'^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?P<slug>[-\w]+)/'
+        'ical/$',
+        EventCalendarView.as_view(),
+        name='rsvp_event_detail_ical'),
+
     url(r'^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?P<slug>[-\w]+)/$',
         EventDetailView.as_view(),
         name='rsvp_event_detail'),
@@ -52,6 +80,22 @@ urlpatterns = patterns(
         GuestCreateView.as_view(),
         name='rsvp_guest_create'),
 
+    url(r'^(?P<event_slug>[-\w]+)/seats/$',
+        EventSeatsView.as_view(),
+        name='rsvp_event_seats'),
+
+    url(r'^(?P<event_slug>[-\w]+)/seats/stream/$',
+        EventSeatsStreamView.as_view(),
+        name='rsvp_event_seats_stream'),
+
+    url(r'^(?P<event_slug>[-\w]+)/waitlist/join/$',
+        WaitlistEntryCreateView.as_view(),
+        name='rsvp_waitlist_create'),
+
+    url(r'^(?P<event_slug>[-\w]+)/guest/export/$',
+        GuestExportView.as_view(),
+        name='rsvp_guest_export'),
+
     url(r'^(?P<event_slug>[-\w]+)/guest/(?P<pk>\d+)/update/$',
         GuestUpdateView.as_view(),
         name='rsvp_guest_update'),
@@ -1,9 +1,22 @@
 """Views for the ``event_rsvp`` app."""
+import datetime
+import json
+
+from django.conf import settings as django_settings
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse
-from django.http import Http404, HttpResponseRedirect
+from django.db.models import Count
+from django.forms.forms import NON_FIELD_ERRORS
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:  # Django < 1.5 streams iterators with a plain response
+    from django.http import HttpResponse as StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.utils.translation import ugettext_lazy as _
 
 from django.views.generic import (
     CreateView,
@@ -11,10 +24,24 @@ from django.views.generic import (
     DetailView,
     ListView,
     UpdateView,
+    View,
 )
 
-from .forms import EventForm, GuestForm
-from .models import Event, Guest
+from . import settings
+from .broker import get_broker
+from .export import iter_guest_csv
+from .ical import get_etag, get_feed_state, get_token_user, get_user_token
+from .ical import iter_calendar
+from .forms import EventForm, GuestForm, WaitlistEntryForm
+from .models import (
+    ArchivedEvent,
+    Event,
+    Guest,
+    SeatsUnavailable,
+    WaitlistEntry,
+)
+from .pagination import get_keyset_page
+from .seats import get_seat_stats, iter_seat_stream
 from .signals import post_guest_create
 
 
@@ -22,6 +49,24 @@ from .signals import post_guest_create
 # Mixins #
 #--------#
 
+class QueryBudgetMixin(object):
+    """
+    Mixin to declare the maximum amount of queries per request of a view.
+
+    The budget doesn't depend on the amount of rows. It is enforced by the
+    tests and checked by the ``QueryBudgetMiddleware``.
+
+    """
+    query_budget = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(QueryBudgetMixin, cls).as_view(**initkwargs)
+        # Django 1.4 doesn't keep a reference to the class on the view
+        view.query_budget = initkwargs.get('query_budget', cls.query_budget)
+        return view
+
+
 class StaffMixin(object):
     """Mixin to let only staff member pass."""
 
@@ -32,6 +77,72 @@ class StaffMixin(object):
         return super(StaffMixin, self).dispatch(request, *args, **kwargs)
 
 
+class KeysetPaginationMixin(object):
+    """Mixin to paginate querysets of a view with cursors."""
+
+    def get_keyset_page(self, queryset, field='start', descending=False,
+                        prefix=''):
+        """
+        Returns the requested ``KeysetPage`` of ``queryset``.
+
+        :param queryset: The queryset to paginate.
+        :param field: Name of the field to order by, together with the pk.
+        :param descending: If ``True`` the newest objects come first.
+        :param prefix: Prefix of the ``after`` and ``before`` GET parameters.
+
+        """
+        return get_keyset_page(
+            queryset, settings.PAGINATE_BY, field,
+            after=self.request.GET.get('{0}after'.format(prefix)),
+            before=self.request.GET.get('{0}before'.format(prefix)),
+            descending=descending, prefix=prefix, query=self.request.GET)
+
+
+class CalendarFeedMixin(object):
+    """
+    Mixin to stream events as iCalendar feed.
+
+    The feed supports conditional GET requests. Its ETag and Last-Modified
+    headers are calculated with one aggregate query, so polling clients get
+    a 304 response without the feed being generated.
+
+    """
+    #: Lookup path from the model of ``get_queryset`` to the event.
+    prefix = ''
+    #: If ``False``, a 404 is raised for feeds without events.
+    allow_empty = True
+    filename = 'events.ics'
+
+    def dispatch(self, request, *args, **kwargs):
+        self.kwargs = kwargs
+        return condition(
+            etag_func=self.get_etag,
+            last_modified_func=self.get_last_modified,
+        )(super(CalendarFeedMixin, self).dispatch)(request, *args, **kwargs)
+
+    def get_feed_state(self):
+        if not hasattr(self, '_feed_state'):
+            self._feed_state = get_feed_state(self.get_queryset(),
+                                              self.prefix)
+            if not self.allow_empty and not self._feed_state[0]:
+                raise Http404
+        return self._feed_state
+
+    def get_etag(self, request, *args, **kwargs):
+        return get_etag(self.get_feed_state())
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return self.get_feed_state()[1]
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(
+            iter_calendar(self.get_queryset(), request, self.prefix),
+            content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
+            self.filename)
+        return response
+
+
 class EventViewMixin(object):
     """Mixin to handle event-specific options."""
     model = Event
@@ -52,17 +163,66 @@ class EventSecurityMixin(object):
     def dispatch(self, request, *args, **kwargs):
         self.kwargs = kwargs
         self.object = self.get_object()
-        date = self.object.start
-        # Check the right starting date within the slug
-        if (date.year != int(kwargs.get('year'))
-                or date.month != int(kwargs.get('month'))
-                or date.day != int(kwargs.get('day'))):
+        if not self.is_canonical_url:
+            # The start date within the URL is wrong
             redirect_url = getattr(self.object, 'get_{0}_url'.format(
                 self.url_mode))
             return HttpResponseRedirect(redirect_url())
         return super(EventSecurityMixin, self).dispatch(request, *args,
                                                         **kwargs)
 
+    def get_url_date(self):
+        """Returns the start of the day in the URL or ``None``."""
+        try:
+            date = datetime.datetime(int(self.kwargs.get('year')),
+                                     int(self.kwargs.get('month')),
+                                     int(self.kwargs.get('day')))
+        except (TypeError, ValueError):
+            return None
+        if django_settings.USE_TZ:
+            # The URLs are built from the start in UTC
+            date = date.replace(tzinfo=timezone.utc)
+        return date
+
+    def get_querysets(self):
+        """Returns the querysets, in which the event is looked up."""
+        return [self.get_queryset()]
+
+    def get_first_object(self, querysets):
+        """Returns the first object of the first non-empty queryset."""
+        for queryset in querysets:
+            objects = list(queryset[:1])
+            if objects:
+                return objects[0]
+        return None
+
+    def get_object(self, queryset=None):
+        """
+        Returns the event of the slug and the date in the URL.
+
+        The event is fetched with one query for the slug and a start within
+        the day of the URL and memoized for the request. Only if there is no
+        such event, it is looked up by its slug alone and ``dispatch``
+        redirects to its canonical URL.
+
+        """
+        if not hasattr(self, '_object'):
+            querysets = [qs.filter(slug=self.kwargs.get('slug')) for qs in (
+                [queryset] if queryset is not None else self.get_querysets())]
+            date = self.get_url_date()
+            self._object = None
+            if date is not None:
+                self._object = self.get_first_object([qs.filter(
+                    start__gte=date,
+                    start__lt=date + timezone.timedelta(days=1))
+                    for qs in querysets])
+            self.is_canonical_url = self._object is not None
+            if self._object is None:
+                self._object = self.get_first_object(querysets)
+                if self._object is None:
+                    raise Http404
+        return self._object
+
 
 class GuestViewMixin(object):
     """Mixin to handle guest-specific functions."""
@@ -70,11 +230,16 @@ class GuestViewMixin(object):
     form_class = GuestForm
 
     def dispatch(self, request, *args, **kwargs):
+        self.kwargs = kwargs
+        self.event = self.get_event()
+        return super(GuestViewMixin, self).dispatch(request, *args, **kwargs)
+
+    def get_event(self):
+        """Returns the event of the URL."""
         try:
-            self.event = Event.objects.get(slug=kwargs.get('event_slug'))
+            return Event.objects.get(slug=self.kwargs.get('event_slug'))
         except Event.DoesNotExist:
             raise Http404
-        return super(GuestViewMixin, self).dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(GuestViewMixin, self).get_context_data(**kwargs)
@@ -89,68 +254,232 @@ class GuestViewMixin(object):
         kwargs.update({'event': self.event, 'user': self.request.user})
         return kwargs
 
+    def form_valid(self, form):
+        try:
+            return super(GuestViewMixin, self).form_valid(form)
+        except SeatsUnavailable:
+            # Someone else has taken the last seats in the meantime
+            form._errors[NON_FIELD_ERRORS] = form.error_class([
+                _("We're sorry. The event is fully booked.")])
+            return self.form_invalid(form)
+
     def get_success_url(self):
         return self.event.get_absolute_url()
 
 
 class GuestSecurityMixin(object):
-    """Mixin to handle guest-specific security options."""
-    def get_object(self, *args, **kwargs):
-        obj = super(GuestSecurityMixin, self).get_object(*args, **kwargs)
-        if obj.event != self.event:
-            raise Http404
-        return obj
+    """
+    Mixin to handle guest-specific security options.
+
+    The guest is fetched together with its event by its pk and the event
+    slug of the URL, so guests of other events raise a 404. Must be listed
+    before ``GuestViewMixin``.
+
+    """
+    def get_queryset(self):
+        return Guest.objects.select_related('event').filter(
+            event__slug=self.kwargs.get('event_slug'))
+
+    def get_object(self, queryset=None):
+        # Memoized, so ``get_event`` and the generic views share one query
+        if not hasattr(self, '_object'):
+            self._object = super(GuestSecurityMixin, self).get_object(
+                queryset)
+        return self._object
+
+    def get_event(self):
+        return self.get_object().event
 
 
 #--------#
 # Views  #
 #--------#
 
-class EventListView(ListView):
+class EventListView(QueryBudgetMixin, KeysetPaginationMixin, ListView):
     """List view to display upcoming events."""
+    query_budget = 4
+
     def get_queryset(self):
-        return Event.objects.filter(start__gt=timezone.now(),
-                                    is_published=True)
+        return Event.objects.filter(
+            start__gt=timezone.now(), is_published=True)
 
     def get_context_data(self, **kwargs):
+        page = self.get_keyset_page(self.object_list)
+        kwargs.update({'object_list': page.object_list})
         context = super(EventListView, self).get_context_data(**kwargs)
+        context.update({'events_page': page})
         if self.request.user.is_authenticated():
+            participations = Guest.objects.filter(
+                user=self.request.user,
+                event__start__gt=timezone.now()).select_related(
+                    'event', 'user')
+            page = self.get_keyset_page(participations, 'event__start',
+                                        prefix='my_')
             context.update({
-                'my_participations': self.request.user.guest_set.all()})
+                'my_participations': page.object_list,
+                'my_participations_page': page,
+                'my_events_ical_url': reverse('rsvp_my_events_ical', kwargs={
+                    'token': get_user_token(self.request.user)}),
+            })
         return context
 
 
-class EventDetailView(EventSecurityMixin, EventViewMixin, DetailView):
+class EventListCalendarView(QueryBudgetMixin, CalendarFeedMixin, View):
+    """iCalendar feed of the upcoming published events."""
+    query_budget = 2
+
+    def get_queryset(self):
+        return Event.objects.filter(start__gt=timezone.now(),
+                                    is_published=True)
+
+
+class EventCalendarView(QueryBudgetMixin, CalendarFeedMixin, View):
+    """iCalendar feed of a single published event."""
+    query_budget = 2
+    allow_empty = False
+
+    def get_queryset(self):
+        return Event.objects.filter(slug=self.kwargs.get('slug'),
+                                    is_published=True)
+
+
+class MyEventsCalendarView(QueryBudgetMixin, CalendarFeedMixin, View):
+    """iCalendar feed of the upcoming events, a user is attending."""
+    query_budget = 3
+    prefix = 'event__'
+    filename = 'my-events.ics'
+
+    def get_queryset(self):
+        if not hasattr(self, 'user'):
+            self.user = get_token_user(self.kwargs.get('token'))
+        if self.user is None:
+            raise Http404
+        return Guest.objects.filter(
+            user=self.user, is_attending=True, event__is_published=True,
+            event__start__gt=timezone.now())
+
+
+class EventSeatsView(QueryBudgetMixin, View):
+    """
+    Returns the seat availability of events as JSON.
+
+    With an ``event_slug`` the stats of that event are returned, otherwise a
+    dict with the stats of all events given by the ``slug`` GET parameters.
+
+    """
+    query_budget = 1
+
+    def get(self, request, *args, **kwargs):
+        slug = kwargs.get('event_slug')
+        if slug:
+            slugs = [slug]
+        else:
+            slugs = request.GET.getlist('slug')[:settings.SEATS_MAX_EVENTS]
+        stats = get_seat_stats(slugs)
+        if slug:
+            try:
+                stats = stats[slug]
+            except KeyError:
+                raise Http404
+        response = HttpResponse(json.dumps(stats),
+                                content_type='application/json')
+        patch_cache_control(response, public=True,
+                            max_age=settings.SEATS_CACHE_TIMEOUT)
+        return response
+
+
+class EventSeatsStreamView(QueryBudgetMixin, View):
+    """
+    Streams the seat stats of an event as server-sent events.
+
+    A message is pushed whenever a guest of the event is saved or deleted.
+    The stream is only available, if ``EVENT_RSVP_SSE_BROKER`` is set.
+
+    """
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        broker = get_broker()
+        if broker is None:
+            raise Http404
+        slug = kwargs.get('event_slug')
+        try:
+            event_id = Event.objects.filter(
+                slug=slug, is_published=True).values_list('pk', flat=True)[0]
+        except IndexError:
+            raise Http404
+        stats = get_seat_stats([slug]).get(slug)
+        if stats is None:
+            raise Http404
+        response = StreamingHttpResponse(
+            iter_seat_stream(broker, event_id, stats),
+            content_type='text/event-stream')
+        patch_cache_control(response, no_cache=True)
+        # Keeps nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class EventDetailView(QueryBudgetMixin, EventSecurityMixin, EventViewMixin,
+                      KeysetPaginationMixin, DetailView):
     """Detail view to display information of an event."""
+    query_budget = 6
     url_mode = 'absolute'
 
     def dispatch(self, request, *args, **kwargs):
         self.kwargs = kwargs
-        self.object = self.get_object()
-        if not self.object.is_published and not request.user.is_staff:
+        # The event is memoized for ``EventSecurityMixin`` and ``get``
+        if not self.get_object().is_published and not request.user.is_staff:
             raise Http404
         return super(EventDetailView, self).dispatch(request, *args, **kwargs)
 
+    def get_querysets(self):
+        # Past events may have been moved to the archive
+        return [self.get_queryset(), ArchivedEvent.objects.all()]
+
+    def get_context_data(self, **kwargs):
+        context = super(EventDetailView, self).get_context_data(**kwargs)
+        if self.request.user.is_staff:
+            guests = self.object.guests.select_related('user').only(
+                'id', 'user', 'name', 'email', 'number_of_seats',
+                'is_attending', 'creation_date')
+            totals = dict((attending, count) for attending, count in (
+                self.object.guests.values_list('is_attending').annotate(
+                    Count('id')).order_by()))
+            context.update({
+                'guests': self.get_keyset_page(
+                    guests, 'creation_date', prefix='guests_'),
+                'attending_count': totals.get(True, 0),
+                'not_attending_count': totals.get(False, 0),
+            })
+        return context
 
-class EventCreateView(StaffMixin, EventViewMixin, CreateView):
+
+class EventCreateView(QueryBudgetMixin, StaffMixin, EventViewMixin,
+                      CreateView):
     """Create view to handle information of an event."""
-    pass
+    query_budget = 4
 
 
-class EventUpdateView(StaffMixin, EventSecurityMixin, EventViewMixin,
-                      UpdateView):
+class EventUpdateView(QueryBudgetMixin, StaffMixin, EventSecurityMixin,
+                      EventViewMixin, UpdateView):
     """Update view to handle information of an event."""
+    query_budget = 6
     url_mode = 'update'
 
 
-class EventDeleteView(StaffMixin, EventSecurityMixin, EventViewMixin,
-                      DeleteView):
+class EventDeleteView(QueryBudgetMixin, StaffMixin, EventSecurityMixin,
+                      EventViewMixin, DeleteView):
     """Delete view to remove the relevant event."""
+    query_budget = 8
     url_mode = 'delete'
 
 
-class EventCreateFromTemplateView(StaffMixin, EventViewMixin, CreateView):
+class EventCreateFromTemplateView(QueryBudgetMixin, StaffMixin, EventViewMixin,
+                                  CreateView):
     """Create view to create information of an event from a template."""
+    query_budget = 5
+
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
         try:
@@ -169,38 +498,93 @@ class EventCreateFromTemplateView(StaffMixin, EventViewMixin, CreateView):
         return kwargs
 
 
-class StaffDashboardView(StaffMixin, ListView):
+class StaffDashboardView(QueryBudgetMixin, StaffMixin, KeysetPaginationMixin,
+                         ListView):
     """View to display event related functions and lists."""
+    query_budget = 6
     model = Event
     template_name = 'event_rsvp/staff_dashboard.html'
 
     def get_context_data(self, **kwargs):
         context = super(StaffDashboardView, self).get_context_data(**kwargs)
-        templates = self.object_list.exclude(template_name__exact='')
-        self.object_list = self.object_list.filter(template_name__exact='')
-        context.update({
-            'upcoming': self.object_list.filter(start__gt=timezone.now()),
-            'current': self.object_list.filter(start__lte=timezone.now(),
-                                               end__gte=timezone.now()),
-            'past': self.object_list.filter(end__lt=timezone.now()),
-            'templates': templates,
-        })
+        now = timezone.now()
+        events = self.object_list.with_attending_count()
+        templates = events.filter(template_name__gt='')
+        events = events.filter(template_name__exact='')
+        buckets = {
+            'upcoming': (events.filter(start__gt=now), 'start', False),
+            'current': (events.filter(start__lte=now, end__gte=now), 'end',
+                        False),
+            'past': (events.filter(end__lt=now), 'end', True),
+            'templates': (templates, 'template_name', False),
+        }
+        for name, (queryset, field, descending) in buckets.items():
+            page = self.get_keyset_page(queryset, field, descending,
+                                        prefix='{0}_'.format(name))
+            context.update({
+                name: page.object_list,
+                '{0}_page'.format(name): page,
+            })
         return context
 
 
-class GuestDetailView(StaffMixin, GuestSecurityMixin, GuestViewMixin,
-                      DetailView):
+class GuestExportView(QueryBudgetMixin, StaffMixin, View):
+    """
+    Streams the guests of one or several events as CSV.
+
+    With an ``event_slug`` the guests of that event are exported, otherwise
+    the guests of all events given by the ``event`` GET parameters, or of all
+    events, if there are none.
+
+    """
+    query_budget = 4
+
+    def get_queryset(self):
+        guests = Guest.objects.all()
+        if self.kwargs.get('event_slug'):
+            try:
+                self.event = Event.objects.get(slug=self.kwargs['event_slug'])
+            except Event.DoesNotExist:
+                raise Http404
+            return guests.filter(event=self.event)
+        pks = [pk for pk in self.request.GET.getlist('event') if pk.isdigit()]
+        if pks:
+            guests = guests.filter(event__pk__in=pks)
+        return guests
+
+    def get_filename(self):
+        if self.kwargs.get('event_slug'):
+            return '{0}-guests.csv'.format(self.event.slug)
+        return 'guests.csv'
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(
+            iter_guest_csv(self.get_queryset()),
+            content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
+            self.get_filename())
+        return response
+
+
+class GuestDetailView(QueryBudgetMixin, StaffMixin, GuestSecurityMixin,
+                      GuestViewMixin, DetailView):
     """View to display guest related functions and lists."""
-    pass
+    query_budget = 3
 
 
-class GuestCreateView(GuestViewMixin, CreateView):
+class GuestCreateView(QueryBudgetMixin, GuestViewMixin, CreateView):
     """Create view to add a guest to an event."""
+    query_budget = 5
+
     def form_valid(self, form):
+        if settings.USE_OUTBOX:
+            # The signal is sent by the ``rsvp_process_outbox`` command
+            form.instance.enqueue_post_guest_create = True
         resp = super(GuestCreateView, self).form_valid(form)
-        post_guest_create.send(
-            sender=self, request=self.request, user=form.user,
-            event=form.event)
+        if not form.errors and not settings.USE_OUTBOX:
+            post_guest_create.send(
+                sender=self, request=self.request, user=form.user,
+                event=form.event)
         return resp
 
     def get_form_kwargs(self):
@@ -212,24 +596,45 @@ class GuestCreateView(GuestViewMixin, CreateView):
         return kwargs
 
 
-class GuestUpdateView(GuestSecurityMixin, GuestViewMixin, UpdateView):
+class GuestUpdateView(QueryBudgetMixin, GuestSecurityMixin, GuestViewMixin,
+                      UpdateView):
     """Update view to handle a guest."""
+    query_budget = 4
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
-        try:
-            self.event = Event.objects.get(slug=kwargs.get('event_slug'))
-        except Event.DoesNotExist:
-            raise Http404
         self.kwargs = kwargs
         self.object = self.get_object()
         if (not request.user.is_staff and not self.object.user
                 and not self.object.user == request.user):
             raise Http404
-        return super(GuestViewMixin, self).dispatch(request, *args, **kwargs)
+        return super(GuestUpdateView, self).dispatch(request, *args, **kwargs)
 
 
-class GuestDeleteView(StaffMixin, GuestViewMixin, GuestSecurityMixin,
-                      DeleteView):
+class GuestDeleteView(QueryBudgetMixin, StaffMixin, GuestSecurityMixin,
+                      GuestViewMixin, DeleteView):
     """Delete view to remove the relevant guest."""
-    pass
+    query_budget = 7
+
+
+class WaitlistEntryCreateView(QueryBudgetMixin, GuestViewMixin, CreateView):
+    """Create view to join the waitlist of a fully booked event."""
+    query_budget = 5
+    model = WaitlistEntry
+    form_class = WaitlistEntryForm
+
+    def dispatch(self, request, *args, **kwargs):
+        self.kwargs = kwargs
+        self.event = self.get_event()
+        free_seats = self.event.get_free_seats_count()
+        if free_seats is None or free_seats > 0:
+            # There is no need to wait, the guest can book right away
+            return HttpResponseRedirect(reverse(
+                'rsvp_guest_create', kwargs={'event_slug': self.event.slug}))
+        return super(GuestViewMixin, self).dispatch(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        resp = super(WaitlistEntryCreateView, self).form_valid(form)
+        # Seats might have been released in the meantime
+        WaitlistEntry.objects.promote(self.event.pk)
+        return resp